@@ -1,7 +1,18 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from cardialyze.startup import lazy_import, prewarm
+from cardialyze.tracing import set_page
+from cardialyze import diagnostics
+from cardialyze.export import download_section
+from cardialyze.figure_cache import get_figure_cache, query_fingerprint
+from cardialyze.history_store import session_history
+from cardialyze import large_charts
+
+# plotly is only imported once a chart is actually drawn
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+
+# Load the model and dataset artifacts in the background while this page renders
+prewarm()
 
 st.set_page_config(
     page_title="Cardialyze",
@@ -9,43 +20,81 @@ st.set_page_config(
     layout='wide'
 )
 
+# Hidden diagnostics view (not in the page navigation), opened with ?diagnostics=1
+if st.query_params.get('diagnostics') == '1':
+    diagnostics.render()
+    st.stop()
+
+set_page('Dashboard')
+
 st.title("Welcome to Cardialyze 👨‍⚕️")
 st.sidebar.success("Select a page above")
 
 st.write("Cardialyze is your personal assistant to help prognose the risk of cardiac arrest based on user inputs.")
 
-if 'history' in st.session_state and st.session_state['history']:
-    # Create a DataFrame from the history
-    history_df = pd.DataFrame(st.session_state['history'])
-    
-    # Rearrange columns to put timestamp first
+history_store = session_history()
+history_state = history_store.state()
+if history_state[0] > 0:
+    # Load only the columns used by the charts, with timestamp first (Result is already a float)
     columns = ['Timestamp', 'Age', 'Gender', 'Chest Pain Type', 'Resting Blood Pressure', 'Serum Cholesterol', 
                'Fasting Blood Sugar', 'ECG Result', 'Max Heart Rate',
                 'Exercise Angina', 'Oldpeak', 'ST Slope', 'Result']
-    history_df = history_df[columns]
 
-    # Remove '%' sign from 'Result' column and convert to float
-    history_df['Result'] = history_df['Result'].str.replace('%', '').astype(float)
+    if history_state[0] > large_charts.LARGE_HISTORY_THRESHOLD:
+        # Listing every test in a multiselect does not scale, select a range of test numbers instead
+        first_test, last_test = history_store.value_range('Test')
+        selected_range = st.sidebar.slider('Filter Tests (test number):', first_test, last_test, (first_test, last_test))
+        all_tests_selected = tuple(selected_range) == (first_test, last_test)
+        test_filters = [] if all_tests_selected else [('Test', 'between', tuple(selected_range))]
+    else:
+        # Filter by Test (test number and timestamp)
+        test_timestamps = history_store.query(['Timestamp'])['Timestamp']
+        test_options = [f"Test {test} - {timestamp}" for test, timestamp in test_timestamps.items()]
+        selected_tests = st.sidebar.multiselect('Filter Tests:', test_options, default=test_options)
 
+        # Extract the selected test numbers
+        selected_test_ids = [int(opt.split(" - ")[0].removeprefix("Test ")) for opt in selected_tests]
+        all_tests_selected = len(selected_test_ids) == len(test_options)
+        test_filters = [] if all_tests_selected else [('Test', 'in', selected_test_ids)]
     
-    # Filter by Test (Timestamp)
-    unique_tests = history_df['Timestamp'].unique().tolist()
-    test_options = [f"Test {i+1} - {timestamp}" for i, timestamp in enumerate(unique_tests)]
-    selected_tests = st.sidebar.multiselect('Filter Tests:', test_options, default=test_options)
+    if all_tests_selected:
+        # No custom test selection: read the running aggregates kept by the history store
+        summary = history_store.summary()
+        total_tests = summary.count
+        highest_result = summary.max
+        lowest_result = summary.min
+    else:
+        # Calculate total tests, highest test result, and lowest test result for the selected tests in SQL
+        total_tests = history_store.count(test_filters)
+        lowest_result, highest_result = history_store.value_range('Result', test_filters)
 
-    # Extract the selected timestamps
-    selected_timestamps = [opt.split(" - ")[1] for opt in selected_tests]
+    # Rows are only read by the chart groups that plot them, and only when their figure is not cached
+    loaded_rows = {}
 
-    # Filter the DataFrame based on the selected tests
-    filtered_df = history_df[history_df['Timestamp'].isin(selected_timestamps)]
-    
-    # Calculate total tests, highest test result, and lowest test result for the filtered data
-    total_tests = len(filtered_df)
-    highest_result = filtered_df['Result'].max()
-    lowest_result = filtered_df['Result'].min()
+    def filtered_rows():
+        if 'rows' not in loaded_rows:
+            loaded_rows['rows'] = history_store.query(columns, test_filters)
+        return loaded_rows['rows']
+
+    def category_counts(column):
+        if all_tests_selected:
+            return summary.counts(column)
+        counts = history_store.query([column], test_filters)[column].value_counts().reset_index()
+        counts.columns = [column, 'Count']
+        return counts
 
     st.write("")
 
+    # Figures are memoized across reruns and sessions, keyed by chart kind and the selected tests.
+    # Tests are only appended, so the store's test count and last test number plus the filters identify the data
+    figure_cache = get_figure_cache()
+    data_key = query_fingerprint(history_store.owner, history_state, test_filters)
+
+    # Large histories switch to WebGL traces and pre-aggregated, downsampled chart data
+    large_mode = total_tests > large_charts.LARGE_HISTORY_THRESHOLD
+    if large_mode:
+        st.caption(f"Showing aggregated charts for {total_tests:,} tests.")
+
     # Display metrics using gauge meters
     col1, col2, col3 = st.columns(3)
     
@@ -53,8 +102,8 @@ if 'history' in st.session_state and st.session_state['history']:
         'margin': {'t': 50, 'b': 0, 'l': 0, 'r': 0},
         'height': 250  # Adjust height if needed
     }
-    
-    with col1:
+
+    def build_total_tests():
         fig_total_tests = go.Figure(go.Indicator(
             mode="gauge+number",
             value=total_tests,
@@ -64,9 +113,9 @@ if 'history' in st.session_state and st.session_state['history']:
                    'bar': {'color': 'purple'}}
         ))
         fig_total_tests.update_layout(gauge_layout)
-        st.plotly_chart(fig_total_tests, use_container_width=True)
-    
-    with col2:
+        return fig_total_tests
+
+    def build_highest_result():
         fig_highest_result = go.Figure(go.Indicator(
             mode="gauge+number",
             value=highest_result,
@@ -78,9 +127,9 @@ if 'history' in st.session_state and st.session_state['history']:
             }
         ))
         fig_highest_result.update_layout(gauge_layout)
-        st.plotly_chart(fig_highest_result, use_container_width=True)
-    
-    with col3:
+        return fig_highest_result
+
+    def build_lowest_result():
         fig_lowest_result = go.Figure(go.Indicator(
             mode="gauge+number",
             value=lowest_result,
@@ -92,80 +141,121 @@ if 'history' in st.session_state and st.session_state['history']:
             }
         ))
         fig_lowest_result.update_layout(gauge_layout)
-        st.plotly_chart(fig_lowest_result, use_container_width=True)
-    
-    # Plotly chart for history with markers
-    fig = px.line(filtered_df, x='Timestamp', y='Result', title='Cardiac Arrest Test History', markers=True, color_discrete_sequence=px.colors.qualitative.Plotly, orientation='h')
-    fig.update_traces(marker=dict(size=10), line=dict(width=2))
+        return fig_lowest_result
 
-    st.plotly_chart(fig, use_container_width=True)
-
-    # Create another row for more visualizations
-    col4, col5, col6 = st.columns(3)
-    
-    # Additional visualization: Bar chart for Age vs Result with color by Timestamp
-    with col4:
-        fig2 = px.bar(filtered_df, x='Age', y='Result', title='Age vs Cardiac Arrest Risk', color='Timestamp', color_continuous_scale=px.colors.sequential.Viridis, orientation='h')
-        fig2.update_layout(legend_title_text='Test Timestamp')
-        st.plotly_chart(fig2, use_container_width=True)
-
-    # Additional visualization: Histogram for Serum Cholesterol
-    with col5:
-        fig3 = px.histogram(filtered_df, x='Serum Cholesterol', title='Serum Cholesterol Distribution', color_discrete_sequence=px.colors.qualitative.T10)
-        st.plotly_chart(fig3, use_container_width=True)
-        
-    # Additional visualization: Box plot for Max Heart Rate
-    with col6:
-        fig4 = px.box(filtered_df, y='Max Heart Rate', title='Max Heart Rate Distribution', color_discrete_sequence=px.colors.qualitative.D3)
-        st.plotly_chart(fig4, use_container_width=True)
-
-    # New advanced visualizations
-    col7, col8, col9 = st.columns(3)
+    with col1:
+        st.plotly_chart(figure_cache.get_or_build('total_tests', total_tests, build_total_tests), use_container_width=True)
     
-    # Donut Chart for Chest Pain Type
-    with col7:
-        chest_pain_counts = filtered_df['Chest Pain Type'].value_counts().reset_index()
-        chest_pain_counts.columns = ['Chest Pain Type', 'Count']
-        fig5 = px.pie(chest_pain_counts, values='Count', names='Chest Pain Type', title='Distribution of Chest Pain Types', hole=0.4, color_discrete_sequence=px.colors.qualitative.Prism)
-        st.plotly_chart(fig5, use_container_width=True)
-
-    # Scatter Plot for Resting Blood Pressure vs. Max Heart Rate
-    with col8:
-        fig6 = px.scatter(filtered_df, x='Resting Blood Pressure', y='Max Heart Rate', color='Gender', title='Resting Blood Pressure vs Max Heart Rate', labels={'Resting Blood Pressure': 'Resting Blood Pressure', 'Max Heart Rate': 'Max Heart Rate'}, color_discrete_sequence=px.colors.qualitative.Set2)
-        st.plotly_chart(fig6, use_container_width=True)
+    with col2:
+        st.plotly_chart(figure_cache.get_or_build('highest_result', highest_result, build_highest_result), use_container_width=True)
     
-    # Violin Plot for Oldpeak distribution across different ST Slope categories
-    with col9:
-        fig7 = px.violin(filtered_df, y='Oldpeak', x='ST Slope', color='Gender', box=True, points="all", title='Oldpeak Distribution by ST Slope', color_discrete_sequence=px.colors.qualitative.Pastel)
-        st.plotly_chart(fig7, use_container_width=True)
+    with col3:
+        st.plotly_chart(figure_cache.get_or_build('lowest_result', lowest_result, build_lowest_result), use_container_width=True)
 
-    st.write("")
-    
-    # New row for additional visualizations
-    col10, col11, col12 = st.columns(3)
-
-    # Pie Chart for Gender distribution
-    with col10:
-        gender_counts = filtered_df['Gender'].value_counts().reset_index()
-        gender_counts.columns = ['Gender', 'Count']
-        fig8 = px.pie(gender_counts, values='Count', names='Gender', title='Gender Distribution', color_discrete_sequence=px.colors.qualitative.Dark2)
-        st.plotly_chart(fig8, use_container_width=True)
-
-    # Sunburst Chart for hierarchical data (e.g., Age, Gender, Chest Pain Type)
-    with col11:
-        fig9 = px.sunburst(filtered_df, path=['Age', 'Gender', 'Chest Pain Type'], title='Hierarchical View of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Set3)
-        st.plotly_chart(fig9, use_container_width=True)
-
-    # Treemap for hierarchical data (e.g., Age, Gender, Chest Pain Type)
-    with col12:
-        fig11 = px.treemap(filtered_df, path=['Age', 'Gender', 'Chest Pain Type'], title='Treemap of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Alphabet)
-        st.plotly_chart(fig11, use_container_width=True)
-
-    # Adjust the index of filtered_df to start from 1 and label it as "Test"
-    filtered_df.index = filtered_df.index + 1
-    filtered_df.index.name = 'Test'
-
-    # Display the filtered DataFrame
-    st.dataframe(filtered_df)
+    # Only the selected group of charts is built, most visits never need more than the gauges
+    section = st.radio(
+        "Choose charts to view",
+        ("Gauges Only", "Test History", "Distributions", "Breakdowns", "Hierarchy", "Data Table"),
+        horizontal=True
+    )
+
+    if section == "Test History":
+        # Plotly chart for history with markers
+        def build_history():
+            if large_mode:
+                return large_charts.history_line(filtered_rows())
+            fig = px.line(filtered_rows(), x='Timestamp', y='Result', title='Cardiac Arrest Test History', markers=True, color_discrete_sequence=px.colors.qualitative.Plotly, orientation='h')
+            fig.update_traces(marker=dict(size=10), line=dict(width=2))
+            return fig
+
+        st.plotly_chart(figure_cache.get_or_build(('history', large_mode), data_key, build_history), use_container_width=True)
+
+    elif section == "Distributions":
+        # Create another row for more visualizations
+        col4, col5, col6 = st.columns(3)
+
+        # Additional visualization: Bar chart for Age vs Result with color by Timestamp
+        def build_age_result():
+            if large_mode:
+                return large_charts.age_result_bar(filtered_rows())
+            fig2 = px.bar(filtered_rows(), x='Age', y='Result', title='Age vs Cardiac Arrest Risk', color='Timestamp', color_continuous_scale=px.colors.sequential.Viridis, orientation='h')
+            fig2.update_layout(legend_title_text='Test Timestamp')
+            return fig2
+
+        with col4:
+            st.plotly_chart(figure_cache.get_or_build(('age_result', large_mode), data_key, build_age_result), use_container_width=True)
+
+        # Additional visualization: Histogram for Serum Cholesterol
+        with col5:
+            if large_mode:
+                fig3 = figure_cache.get_or_build(('cholesterol', True), data_key, lambda: large_charts.histogram(filtered_rows(), 'Serum Cholesterol', 'Serum Cholesterol Distribution', px.colors.qualitative.T10[0]))
+            else:
+                fig3 = figure_cache.get_or_build('cholesterol', data_key, lambda: px.histogram(filtered_rows(), x='Serum Cholesterol', title='Serum Cholesterol Distribution', color_discrete_sequence=px.colors.qualitative.T10))
+            st.plotly_chart(fig3, use_container_width=True)
+
+        # Additional visualization: Box plot for Max Heart Rate
+        with col6:
+            if large_mode:
+                fig4 = figure_cache.get_or_build(('heart_rate', True), data_key, lambda: large_charts.quantile_box(filtered_rows(), 'Max Heart Rate', 'Max Heart Rate Distribution', px.colors.qualitative.D3[0]))
+            else:
+                fig4 = figure_cache.get_or_build('heart_rate', data_key, lambda: px.box(filtered_rows(), y='Max Heart Rate', title='Max Heart Rate Distribution', color_discrete_sequence=px.colors.qualitative.D3))
+            st.plotly_chart(fig4, use_container_width=True)
+
+    elif section == "Breakdowns":
+        # New advanced visualizations
+        col7, col8, col9 = st.columns(3)
+
+        # Donut Chart for Chest Pain Type
+        with col7:
+            fig5 = figure_cache.get_or_build('chest_pain', data_key, lambda: px.pie(category_counts('Chest Pain Type'), values='Count', names='Chest Pain Type', title='Distribution of Chest Pain Types', hole=0.4, color_discrete_sequence=px.colors.qualitative.Prism))
+            st.plotly_chart(fig5, use_container_width=True)
+
+        # Scatter Plot for Resting Blood Pressure vs. Max Heart Rate
+        with col8:
+            if large_mode:
+                fig6 = figure_cache.get_or_build(('bp_heart_rate', True), data_key, lambda: large_charts.counted_scatter(filtered_rows(), 'Resting Blood Pressure', 'Max Heart Rate', 'Gender', 'Resting Blood Pressure vs Max Heart Rate', px.colors.qualitative.Set2))
+            else:
+                fig6 = figure_cache.get_or_build('bp_heart_rate', data_key, lambda: px.scatter(filtered_rows(), x='Resting Blood Pressure', y='Max Heart Rate', color='Gender', title='Resting Blood Pressure vs Max Heart Rate', labels={'Resting Blood Pressure': 'Resting Blood Pressure', 'Max Heart Rate': 'Max Heart Rate'}, color_discrete_sequence=px.colors.qualitative.Set2))
+            st.plotly_chart(fig6, use_container_width=True)
+
+        # Violin Plot for Oldpeak distribution across different ST Slope categories
+        with col9:
+            if large_mode:
+                # Violins need every point, so large histories show the same split as quantile boxes
+                fig7 = figure_cache.get_or_build(('oldpeak', True), data_key, lambda: large_charts.quantile_box(filtered_rows(), 'Oldpeak', 'Oldpeak Distribution by ST Slope', None, x='ST Slope', group='Gender', colors=px.colors.qualitative.Pastel))
+            else:
+                fig7 = figure_cache.get_or_build('oldpeak', data_key, lambda: px.violin(filtered_rows(), y='Oldpeak', x='ST Slope', color='Gender', box=True, points="all", title='Oldpeak Distribution by ST Slope', color_discrete_sequence=px.colors.qualitative.Pastel))
+            st.plotly_chart(fig7, use_container_width=True)
+
+    elif section == "Hierarchy":
+        # New row for additional visualizations
+        col10, col11, col12 = st.columns(3)
+
+        # Pie Chart for Gender distribution
+        with col10:
+            fig8 = figure_cache.get_or_build('gender', data_key, lambda: px.pie(category_counts('Gender'), values='Count', names='Gender', title='Gender Distribution', color_discrete_sequence=px.colors.qualitative.Dark2))
+            st.plotly_chart(fig8, use_container_width=True)
+
+        # Sunburst Chart for hierarchical data (e.g., Age, Gender, Chest Pain Type)
+        with col11:
+            if large_mode:
+                fig9 = figure_cache.get_or_build(('sunburst', True), data_key, lambda: px.sunburst(large_charts.age_hierarchy_counts(filtered_rows()), path=['Age', 'Gender', 'Chest Pain Type'], values='Count', title='Hierarchical View of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Set3))
+            else:
+                fig9 = figure_cache.get_or_build('sunburst', data_key, lambda: px.sunburst(filtered_rows(), path=['Age', 'Gender', 'Chest Pain Type'], title='Hierarchical View of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Set3))
+            st.plotly_chart(fig9, use_container_width=True)
+
+        # Treemap for hierarchical data (e.g., Age, Gender, Chest Pain Type)
+        with col12:
+            if large_mode:
+                fig11 = figure_cache.get_or_build(('treemap', True), data_key, lambda: px.treemap(large_charts.age_hierarchy_counts(filtered_rows()), path=['Age', 'Gender', 'Chest Pain Type'], values='Count', title='Treemap of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Alphabet))
+            else:
+                fig11 = figure_cache.get_or_build('treemap', data_key, lambda: px.treemap(filtered_rows(), path=['Age', 'Gender', 'Chest Pain Type'], title='Treemap of Age, Gender, and Chest Pain Type', color_discrete_sequence=px.colors.qualitative.Alphabet))
+            st.plotly_chart(fig11, use_container_width=True)
+
+    elif section == "Data Table":
+        # Display the selected tests (indexed by test number)
+        st.dataframe(filtered_rows())
+        # The export re-reads the selected tests from the store in chunks instead of serializing the table
+        download_section(history_store, columns, test_filters, total_tests, key='dashboard')
 else:
     st.write("No history available.")
@@ -0,0 +1,67 @@
+"""Compare the array-compiled ensemble with XGBClassifier.predict_proba.
+
+    python benchmarks/bench_compiled_model.py
+
+Prints a JSON list with the median time per call and the largest probability
+difference for batch sizes 1, 100 and 100k. ``compiled_ms`` always evaluates
+the flat arrays; ``hybrid_ms`` is what the app uses with
+``CARDIALYZE_PREDICTOR=compiled``, which hands large batches back to XGBoost.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cardialyze.compiled_model import CompiledEnsemble  # noqa: E402
+from cardialyze.model_artifact import load_model_file  # noqa: E402
+from cardialyze.model_registry import MODEL_PATH  # noqa: E402
+
+BATCH_SIZES = [1, 100, 100_000]
+
+
+def random_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(28, 78, n), rng.integers(0, 2, n), rng.integers(0, 4, n), rng.integers(92, 171, n),
+        rng.integers(85, 395, n), rng.integers(0, 2, n), rng.integers(0, 3, n), rng.integers(80, 203, n),
+        rng.integers(0, 2, n), rng.uniform(0.0, 3.6, n).round(1), rng.integers(0, 3, n),
+    ]).astype(np.float64)
+
+
+def median_seconds(fn, X, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def main():
+    model = load_model_file(MODEL_PATH)
+    compiled = CompiledEnsemble.from_model(model)
+
+    results = []
+    for batch_size in BATCH_SIZES:
+        X = random_features(batch_size)
+        repeats = 5 if batch_size >= 10_000 else 500
+        xgboost_seconds = median_seconds(model.predict_proba, X, repeats)
+        compiled_seconds = median_seconds(compiled.evaluate, X, repeats)
+        hybrid_seconds = median_seconds(compiled.predict_proba, X, repeats)
+        results.append({
+            'batch_size': batch_size,
+            'xgboost_ms': round(xgboost_seconds * 1000, 4),
+            'compiled_ms': round(compiled_seconds * 1000, 4),
+            'hybrid_ms': round(hybrid_seconds * 1000, 4),
+            'compiled_speedup': round(xgboost_seconds / compiled_seconds, 2),
+            'max_abs_diff': float(np.abs(compiled.evaluate(X) - model.predict_proba(X)).max()),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Latency of concurrent sessions predicting directly versus through the shared inference executor.
+
+    python benchmarks/bench_inference.py [--sessions 64] [--requests 200]
+
+Every session is a thread that scores ``--requests`` single random patients
+one after the other, the way Prognose sessions call the model:
+
+* ``direct``: each thread calls ``predict_proba`` on the shared model, with
+  XGBoost's default thread count (all cores),
+* ``executor``: each thread goes through ``cardialyze.inference``, with
+  its default pool (one single-threaded worker per core).
+
+Prints JSON with throughput, latency percentiles, busy rejections and the
+executor's mean coalesced batch size.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_compiled_model import random_features  # noqa: E402
+from cardialyze.inference import InferenceBusy, InferenceExecutor  # noqa: E402
+from cardialyze.model_registry import ModelRegistry  # noqa: E402
+
+
+def run_sessions(predict, sessions, requests, seed=0):
+    latencies = [[] for _ in range(sessions)]
+    busy = [0] * sessions
+    start = threading.Barrier(sessions + 1)
+
+    def session(i):
+        rows = random_features(requests, seed=seed + i)
+        start.wait()
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                predict(row.reshape(1, -1))
+            except InferenceBusy:
+                busy[i] += 1
+                continue
+            latencies[i].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies = np.concatenate([np.asarray(session_latencies) for session_latencies in latencies]) * 1000
+    return {
+        'requests_per_second': round(len(latencies) / seconds),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+        'busy': sum(busy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    # The executor pins its own copy of the model, the direct run keeps XGBoost's defaults
+    model = ModelRegistry().get()
+    executor = InferenceExecutor()
+
+    results = {'cpus': os.cpu_count(), 'sessions': args.sessions, 'requests_per_session': args.requests}
+    results['direct'] = run_sessions(model.predictor.predict_proba, args.sessions, args.requests)
+    results['executor'] = run_sessions(executor.bind(model).predictor.predict_proba, args.sessions, args.requests)
+    results['executor']['mean_batch_requests'] = round(executor.mean_batch_requests, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
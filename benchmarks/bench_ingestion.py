@@ -0,0 +1,142 @@
+"""Vectorized ingestion (cardialyze.ingestion) versus the notebooks' row-wise cleaning.
+
+    python benchmarks/bench_ingestion.py [--rows 10000000] [--notebook-rows 1000000]
+
+Writes a synthetic UCI blend of ``--rows`` patients, split over four
+headerless ``processed.*.data``-style files, with about 5% ``?`` in the
+columns that have missing values in the real files. It then times:
+
+* ``vectorized``: ``cardialyze.ingestion.ingest`` on every file, Parquet
+  output included,
+* ``notebook``: the code of ``blending_data.ipynb`` and ``prepare_data.ipynb``
+  (per-file ``read_csv``, ``apply(axis=1)`` to find ``?``, ``int(float(x))``
+  per value). It is far too slow for 10M rows, so it runs on the first
+  ``--notebook-rows`` rows of each file. Its time is scaled linearly to the
+  full size and flagged as extrapolated. The vectorized module is also timed
+  on that subset and must produce the same frame.
+
+Prints JSON.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cardialyze.ingestion import RAW_COLUMNS, ingest  # noqa: E402
+
+SOURCES = ['cleveland', 'hungarian', 'switzerland', 'va']
+
+# Columns with '?' in the UCI files
+MISSING_COLUMNS = ['trestbps', 'chol', 'fbs', 'restecg', 'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
+
+
+def synthetic_sources(directory, rows, seed=0, missing=0.05, block_rows=1_000_000):
+    """Write ``rows`` random patients as four headerless UCI files and return their paths."""
+    rng = np.random.default_rng(seed)
+    paths = [Path(directory) / f'processed.{name}.data' for name in SOURCES]
+    per_file = np.array_split(np.arange(rows), len(paths))
+    for path, indices in zip(paths, per_file):
+        written = 0
+        while written < len(indices):
+            n = min(block_rows, len(indices) - written)
+            block = pd.DataFrame({
+                'age': rng.integers(28, 78, n), 'sex': rng.integers(0, 2, n), 'cp': rng.integers(1, 5, n),
+                'trestbps': rng.integers(92, 201, n), 'chol': rng.integers(85, 604, n),
+                'fbs': rng.integers(0, 2, n), 'restecg': rng.integers(0, 3, n), 'thalach': rng.integers(60, 203, n),
+                'exang': rng.integers(0, 2, n), 'oldpeak': rng.uniform(0.0, 6.2, n).round(1),
+                'slope': rng.integers(1, 4, n), 'ca': rng.integers(0, 4, n), 'thal': rng.choice([3, 6, 7], n),
+                'output': rng.integers(0, 5, n),
+            })
+            for col in MISSING_COLUMNS:
+                values = block[col].astype('Float64' if col == 'oldpeak' else 'Int64')
+                block[col] = values.mask(rng.random(n) < missing)
+            block.to_csv(path, mode='a' if written else 'w', header=False, index=False, na_rep='?')
+            written += n
+    return paths
+
+
+def head_sources(paths, directory, rows_per_file):
+    """Copies of ``paths`` cut to their first ``rows_per_file`` lines."""
+    heads = []
+    for path in paths:
+        head = Path(directory) / f'head.{path.name}'
+        with open(path) as src, open(head, 'w') as dst:
+            for i, line in enumerate(src):
+                if i >= rows_per_file:
+                    break
+                dst.write(line)
+        heads.append(head)
+    return heads
+
+
+def notebook_ingest(paths):
+    """blending_data.ipynb followed by prepare_data.ipynb, as written in the notebooks."""
+    # blending_data.ipynb
+    data_frames = []
+    for data_file in paths:
+        df = pd.read_csv(data_file, delimiter=',', header=None, names=RAW_COLUMNS)
+        data_frames.append(df)
+    df = pd.concat(data_frames, ignore_index=True)
+
+    # prepare_data.ipynb
+    df['output'] = df['output'].replace([1, 2, 3, 4], 1)
+    df = df.drop(columns=['thal', 'ca'])
+    df[df.apply(lambda row: any('?' in str(value) for value in row), axis=1)]
+    df[~df.apply(lambda row: any('?' in str(value) for value in row), axis=1)]
+    df = df.replace(['?'], np.nan)
+    for column in ['fbs', 'restecg', 'exang', 'slope']:
+        df[column] = df[column].fillna(df[column].mode().iloc[0])
+    for column in ['trestbps', 'chol', 'thalach', 'oldpeak']:
+        df[column] = df[column].fillna(df[column].astype(float).mean())
+    for column in ['age', 'sex', 'chol', 'thalach', 'trestbps', 'cp', 'fbs', 'restecg', 'exang', 'slope']:
+        df[column] = df[column].apply(lambda x: int(float(x)) if isinstance(x, str) else int(x))
+    df['oldpeak'] = df['oldpeak'].astype(float)
+    return df.drop_duplicates()
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--notebook-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        paths = synthetic_sources(scratch, args.rows)
+        subset = min(args.notebook_rows, args.rows)
+        heads = head_sources(paths, scratch, -(-subset // len(paths)))
+
+        expected, notebook_seconds = timed(notebook_ingest, heads)
+        actual, subset_seconds = timed(ingest, heads, Path(scratch) / 'subset.parquet')
+        pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True), check_dtype=False)
+
+        cleaned, full_seconds = timed(ingest, paths, Path(scratch) / 'ohca.parquet')
+
+    notebook_full = notebook_seconds * args.rows / subset
+    print(json.dumps({
+        'rows': args.rows,
+        'rows_after_cleaning': len(cleaned),
+        'vectorized_seconds': round(full_seconds, 2),
+        'notebook_seconds': round(notebook_full, 2),
+        'notebook_extrapolated': subset < args.rows,
+        'speedup': round(notebook_full / full_seconds, 1),
+        'subset': {'rows': subset, 'notebook_seconds': round(notebook_seconds, 2),
+                   'vectorized_seconds': round(subset_seconds, 2),
+                   'speedup': round(notebook_seconds / subset_seconds, 1), 'identical_output': True},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
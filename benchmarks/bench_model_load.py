@@ -0,0 +1,78 @@
+"""Load time of the pickled model versus the native UBJSON artifact.
+
+    python benchmarks/bench_model_load.py [--repeats 20]
+
+Converts the shipped pickle to a temporary native artifact. Both are then
+loaded the way the app does (cardialyze.model_artifact.load_model_file):
+
+* ``cold_ms``: a fresh interpreter loads the file once, including the
+  xgboost import (what the first request after a scale-from-zero pays),
+* ``warm_ms``: the median of ``--repeats`` loads in one process.
+
+Prints JSON. Both models must give identical probabilities.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cardialyze.model_artifact import convert, load_model_file  # noqa: E402
+from cardialyze.model_registry import PICKLE_PATH  # noqa: E402
+
+COLD_LOAD = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from cardialyze.model_artifact import load_model_file
+load_model_file({path!r})
+print(time.perf_counter() - started)
+"""
+
+
+def cold_seconds(path):
+    completed = subprocess.run([sys.executable, "-c", COLD_LOAD.format(root=str(ROOT), path=str(path))],
+                               capture_output=True, text=True, check=True)
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def warm_seconds(path, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load_model_file(path)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        native = convert(PICKLE_PATH, Path(scratch) / 'model.ubj')
+        X = np.array([[28, 1, 0, 92, 85, 0, 0, 80, 0, 0.0, 0], [63, 1, 3, 145, 233, 1, 2, 150, 0, 2.3, 2]], dtype=float)
+        difference = np.abs(load_model_file(PICKLE_PATH).predict_proba(X) - load_model_file(native).predict_proba(X)).max()
+
+        results = []
+        for name, path in (('pickle', PICKLE_PATH), ('ubj', native)):
+            results.append({
+                'format': name,
+                'bytes': path.stat().st_size,
+                'cold_ms': round(cold_seconds(path) * 1000, 1),
+                'warm_ms': round(warm_seconds(path, args.repeats) * 1000, 3),
+            })
+    print(json.dumps({'max_abs_diff': float(difference), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
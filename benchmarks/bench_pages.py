@@ -0,0 +1,247 @@
+"""Headless page benchmarks with Streamlit's AppTest.
+
+    python benchmarks/bench_pages.py [--sizes 10 1000 10000 100000] [--reruns 5]
+                                     [--baseline previous.json] [--output result.json]
+
+For every history size a synthetic history database is seeded once. The
+history lives in the SQLite store (cardialyze.history_store) rather than in
+``session_state['history']``, under the owner ``BENCH_OWNER`` that every
+case runs as (``CARDIALYZE_HISTORY_OWNER``). Each case (a page, or one variant of it) then
+runs in its own interpreter against a private copy of that database, so
+peak RSS is per case and the Prognose run does not grow the history seen by
+other cases.
+
+Every case records:
+
+* ``first_run_ms``: the first run in a fresh interpreter, including imports and
+  artifact loads,
+* ``rerun_ms``: the median of ``--reruns`` further reruns,
+* ``payload_bytes``: the size of the Plotly figure JSON and Arrow dataframe
+  data that the run sent to the frontend,
+* ``peak_rss_mb``: the peak resident set size of the case's process.
+
+The Dashboard runs once for every chart section. The Prognose case fills in
+the patient's name and IC number and clicks Calculate, so it includes a
+prediction. predict_proba is also
+timed at several batch sizes, for both predictors. Output is JSON. With
+``--baseline``, every case gets its ``rerun_ms`` ratio against the matching
+case of an earlier run. Needs no network access.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_compiled_model import median_seconds, random_features  # noqa: E402
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+
+PAGES = [ROOT / "Dashboard.py"] + sorted((ROOT / "pages").glob("*.py"))
+
+PREDICT_BATCH_SIZES = [1, 10, 100, 1_000, 10_000]
+
+# Owner of the seeded tests and of every page run
+BENCH_OWNER = 'bench'
+
+# Patient fields of the Prognose form, with the ranges its widgets allow
+CATEGORY_FIELDS = ['Gender', 'Chest Pain Type', 'Fasting Blood Sugar', 'ECG Result', 'Exercise Angina', 'ST Slope']
+
+
+def synthetic_record(rng):
+    from cardialyze.features import CATEGORIES
+
+    record = {
+        'Name': f'Patient {rng.randrange(10**6)}',
+        'IC Number': f'{rng.randrange(10**6):06d}-{rng.randrange(100):02d}-{rng.randrange(10**4):04d}',
+        'Age': rng.randint(28, 77),
+        'Resting Blood Pressure': rng.randint(92, 170),
+        'Serum Cholesterol': rng.randint(85, 394),
+        'Max Heart Rate': rng.randint(80, 202),
+        'Oldpeak': round(rng.uniform(0.0, 3.6), 1),
+    }
+    for field in CATEGORY_FIELDS:
+        record[field] = rng.choice(CATEGORIES[field])
+    return record
+
+
+def seed_history(path, size, seed=0):
+    from cardialyze.history_store import HistoryStore
+
+    rng = random.Random(seed)
+    now = time.time()
+    with HistoryStore(path, owner=BENCH_OWNER) as store:
+        for _ in range(size):
+            store.append(synthetic_record(rng), result=round(rng.uniform(0, 100), 2),
+                         timestamp=now - rng.randint(0, 365 * 24 * 3600))
+
+
+def copy_database(source, dest):
+    # The backup API also copies whatever is still in the WAL file
+    with sqlite3.connect(source) as src, sqlite3.connect(dest) as dst:
+        src.backup(dst)
+
+
+def payload_bytes(at):
+    figures = sum(len(chart.proto.spec) for chart in at.get("plotly_chart"))
+    frames = sum(len(frame.proto.arrow_data.data) for frame in at.dataframe)
+    return figures + frames
+
+
+def timed_run(at):
+    started = time.perf_counter()
+    at.run()
+    return (time.perf_counter() - started) * 1000
+
+
+def calculate(at):
+    # Calculate only predicts once both patient fields are filled in
+    at.text_input[0].input("Benchmark Patient")
+    at.text_input[1].input("900101-01-1234")
+    at.button[0].click()
+
+
+def page_variants(page):
+    """(name, setup) pairs for one page; ``setup(at)`` prepares widgets after the first run."""
+    if page.name == "Dashboard.py":
+        sections = ["Gauges Only", "Test History", "Distributions", "Breakdowns", "Hierarchy", "Data Table"]
+        return [(section, lambda at, section=section: at.radio[0].set_value(section)) for section in sections]
+    if "Prognose" in page.name:
+        return [("calculate", calculate)]
+    return [("default", None)]
+
+
+def run_case(page, variant, reruns):
+    """Benchmark one variant of a page in this interpreter (called in a subprocess)."""
+    from streamlit.testing.v1 import AppTest
+
+    setup = dict(page_variants(page))[variant]
+    at = AppTest.from_file(str(page), default_timeout=600)
+    first_run_ms = timed_run(at)
+    if setup is not None:
+        setup(at)
+        first_run_ms += timed_run(at)
+    rerun_ms = [timed_run(at) for _ in range(reruns)]
+    return {
+        'page': page.name,
+        'variant': variant,
+        'first_run_ms': round(first_run_ms, 1),
+        'rerun_ms': round(statistics.median(rerun_ms), 1),
+        'payload_bytes': payload_bytes(at),
+        'exceptions': [exception.value for exception in at.exception],
+        'warnings': [warning.value for warning in at.warning],
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def bench_pages(sizes, reruns):
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for size in sizes:
+            seeded = Path(scratch) / f"history-{size}.db"
+            started = time.perf_counter()
+            seed_history(seeded, size)
+            print(f"seeded {size:,} tests in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            for i, page in enumerate(PAGES):
+                for j, (variant, _) in enumerate(page_variants(page)):
+                    database = Path(scratch) / f"page-{size}-{i}-{j}.db"
+                    copy_database(seeded, database)
+                    env = dict(os.environ, CARDIALYZE_HISTORY_DB=str(database), CARDIALYZE_HISTORY_OWNER=BENCH_OWNER,
+                               PYTHONPATH=str(ROOT))
+                    completed = subprocess.run([sys.executable, __file__, "--page", str(page), "--variant", variant,
+                                                "--reruns", str(reruns)],
+                                               cwd=ROOT, env=env, capture_output=True, text=True)
+                    if completed.returncode != 0:
+                        raise RuntimeError(f"{page.name} [{variant}] at {size} tests failed:\n{completed.stderr}")
+                    case = json.loads(completed.stdout)
+                    results.append({'history_size': size, **case})
+                    print(f"{size:>7,} {case['page']} [{case['variant']}]: {case['rerun_ms']} ms", file=sys.stderr)
+    return results
+
+
+def bench_predict_proba():
+    from cardialyze.compiled_model import CompiledEnsemble
+    from cardialyze.model_artifact import load_model_file
+    from cardialyze.model_registry import MODEL_PATH
+
+    model = load_model_file(MODEL_PATH)
+    predictors = {'xgboost': model, 'compiled': CompiledEnsemble.from_model(model)}
+    results = []
+    for batch_size in PREDICT_BATCH_SIZES:
+        X = random_features(batch_size)
+        repeats = 5 if batch_size >= 10_000 else 200
+        for name, predictor in predictors.items():
+            seconds = median_seconds(predictor.predict_proba, X, repeats)
+            results.append({'predictor': name, 'batch_size': batch_size,
+                            'median_ms': round(seconds * 1000, 4),
+                            'rows_per_second': round(batch_size / seconds)})
+    return results
+
+
+def compare(results, baseline):
+    key = lambda case: (case['history_size'], case['page'], case['variant'])  # noqa: E731
+    previous = {key(case): case for case in baseline['pages']}
+    for case in results['pages']:
+        before = previous.get(key(case))
+        if before and before['rerun_ms']:
+            case['rerun_vs_baseline'] = round(case['rerun_ms'] / before['rerun_ms'], 3)
+    previous = {(case['predictor'], case['batch_size']): case for case in baseline['predict_proba']}
+    for case in results['predict_proba']:
+        before = previous.get((case['predictor'], case['batch_size']))
+        if before and before['median_ms']:
+            case['median_vs_baseline'] = round(case['median_ms'] / before['median_ms'], 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every page headlessly with AppTest.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="history sizes to seed")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, help="earlier JSON output to compare against")
+    parser.add_argument("--output", type=Path, help="write the JSON here instead of stdout")
+    parser.add_argument("--page", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.page:
+        print(json.dumps(run_case(args.page, args.variant, args.reruns)))
+        return
+
+    import streamlit
+    import xgboost
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'streamlit': streamlit.__version__,
+            'xgboost': xgboost.__version__,
+        },
+        'pages': bench_pages(args.sizes, args.reruns),
+        'predict_proba': bench_predict_proba(),
+    }
+    if args.baseline:
+        compare(results, json.loads(args.baseline.read_text()))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
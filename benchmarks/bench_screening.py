@@ -0,0 +1,73 @@
+"""Throughput of the multi-core screening CLI (cardialyze.screening).
+
+    python benchmarks/bench_screening.py [--rows 1000000] [--workers 1 2 4 8] [--format csv]
+
+Writes a synthetic OHCA.csv-layout extract and scores it with every worker
+count. Prints a JSON list with rows per second and the speedup over one
+worker. Each worker count runs once, and the timings include the pool start
+and the per-worker model load.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cardialyze.screening import DEFAULT_CHUNK_ROWS, score_file  # noqa: E402
+
+
+def synthetic_extract(path, rows, seed=0, block_rows=1_000_000):
+    """Write ``rows`` random patients in the raw OHCA.csv layout (UCI codes)."""
+    rng = np.random.default_rng(seed)
+    written = 0
+    while written < rows:
+        n = min(block_rows, rows - written)
+        block = pd.DataFrame({
+            'age': rng.integers(28, 78, n), 'sex': rng.integers(0, 2, n), 'cp': rng.integers(1, 5, n),
+            'trestbps': rng.integers(92, 171, n), 'chol': rng.integers(85, 395, n), 'fbs': rng.integers(0, 2, n),
+            'restecg': rng.integers(0, 3, n), 'thalach': rng.integers(80, 203, n), 'exang': rng.integers(0, 2, n),
+            'oldpeak': rng.uniform(0.0, 3.6, n).round(1), 'slope': rng.integers(1, 4, n),
+            'ca': rng.integers(0, 4, n), 'thal': rng.choice([3, 6, 7], n), 'output': rng.integers(0, 5, n),
+        })
+        block.to_csv(path, mode='a' if written else 'w', header=not written, index=False)
+        written += n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count()} & set(range(1, os.cpu_count() + 1))))
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        source = Path(scratch) / 'extract.csv'
+        synthetic_extract(source, args.rows)
+        for workers in args.workers:
+            started = time.perf_counter()
+            rows = score_file(source, Path(scratch) / f'scored.{args.format}', workers=workers,
+                              chunk_rows=args.chunk_rows)
+            seconds = time.perf_counter() - started
+            results.append({'workers': workers, 'rows': rows, 'seconds': round(seconds, 2),
+                            'rows_per_second': round(rows / seconds)})
+
+    single = next((result['rows_per_second'] for result in results if result['workers'] == 1), None)
+    for result in results:
+        if single:
+            result['speedup'] = round(result['rows_per_second'] / single, 2)
+    print(json.dumps({'cpus': os.cpu_count(), 'rows': args.rows, 'format': args.format, 'results': results},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
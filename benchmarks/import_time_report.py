@@ -0,0 +1,108 @@
+"""Import-time report of every page, checked against a cold-start budget.
+
+    python benchmarks/import_time_report.py [--budget-ms 40] [--top 8]
+
+Each page's top-level imports run in a fresh interpreter under
+``python -X importtime``. Streamlit itself is imported first and left out of
+the totals, since the server has always loaded it before a page runs. Prints
+a JSON list with the total import time and the slowest top-level imports of
+each page, and exits with status 1 if any page is over its budget.
+
+Every page needs numpy and pandas (the feature encoding and the history
+store are built on them), and together they take about 400 ms, so their
+import is reported separately and not counted against the budget. The rest
+is the page's own import path, which stays within a few tens of
+milliseconds as long as the model, inference, plotting and export modules
+are imported lazily.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PAGES = [ROOT / "Dashboard.py"] + sorted((ROOT / "pages").glob("*.py"))
+
+# Milliseconds of imports allowed per page on top of streamlit, numpy and pandas, measured on a warm
+# disk cache. The pages take 10-30 ms; importing the model registry (joblib, the compiled ensemble),
+# batch scoring and export at the top of the Prognose page takes it to about 55 ms
+DEFAULT_BUDGET_MS = 40
+
+# Imported by every page, reported but not counted against the budget
+BASE_MODULES = ('numpy', 'pandas')
+
+
+def page_imports(path):
+    """Source of the import statements at the top level of a page script."""
+    tree = ast.parse(path.read_text(encoding='utf-8'))
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def import_times(statements):
+    """(module, self_us, cumulative_us, depth) for every module the statements import after streamlit."""
+    code = "import streamlit\n" + "\n".join(statements)
+    env = dict(os.environ, PYTHONPATH=str(ROOT), CARDIALYZE_PREWARM="0")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    # Everything up to and including the top-level streamlit entry was already loaded by the server
+    streamlit_end = next(i for i, row in enumerate(rows) if row[0] == "streamlit" and row[3] == 0)
+    return rows[streamlit_end + 1:]
+
+
+def base_us(rows):
+    """Microseconds spent importing ``BASE_MODULES``, including everything they import."""
+    total, inside = 0, None
+    # importtime lists a module after the modules it imports, so read backwards to see parents first
+    for name, _, cumulative_us, depth in reversed(rows):
+        if inside is not None and depth > inside:
+            continue
+        inside = None
+        if name in BASE_MODULES:
+            total += cumulative_us
+            inside = depth
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports listed per page")
+    args = parser.parse_args()
+
+    report, over_budget = [], False
+    for page in PAGES:
+        rows = import_times(page_imports(page))
+        total_ms = sum(row[1] for row in rows) / 1000
+        base_ms = base_us(rows) / 1000
+        top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: row[2], reverse=True)
+        within_budget = total_ms - base_ms <= args.budget_ms
+        over_budget |= not within_budget
+        report.append({
+            'page': page.name,
+            'import_ms': round(total_ms, 1),
+            'numpy_pandas_ms': round(base_ms, 1),
+            'page_import_ms': round(total_ms - base_ms, 1),
+            'budget_ms': args.budget_ms,
+            'within_budget': within_budget,
+            'slowest': [{'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+                        for name, _, cumulative, _ in top_level[:args.top]],
+        })
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
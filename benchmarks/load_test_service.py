@@ -0,0 +1,92 @@
+"""Load test for the headless scoring service (cardialyze.service).
+
+Start the service first, then run for example::
+
+    python -m cardialyze.service --port 8502
+    python benchmarks/load_test_service.py --port 8502 --concurrency 64 --requests 20000
+
+Run it against ``--max-batch-size 1`` to compare with one ``predict_proba``
+call per request. Prints a JSON summary with throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+PATIENT_RANGES = {
+    'Age': (28, 77), 'Resting Blood Pressure': (92, 170), 'Serum Cholesterol': (85, 394), 'Max Heart Rate': (80, 202),
+}
+PATIENT_CHOICES = {
+    'Gender': ['Male', 'Female'],
+    'Chest Pain Type': ['Typical Angina', 'Atypical Angina', 'Non-Anginal Pain', 'Asymptomatic'],
+    'Fasting Blood Sugar': ['Below 120', 'Above 120'],
+    'ECG Result': ['Normal', 'ST-T Wave Abnormality', 'Left Ventricular Hypertrophy'],
+    'Exercise Angina': ['Yes', 'No'],
+    'ST Slope': ['Upsloping', 'Flat', 'Downsloping'],
+}
+
+
+def random_patient(rng):
+    patient = {col: rng.randint(low, high) for col, (low, high) in PATIENT_RANGES.items()}
+    patient.update({col: rng.choice(options) for col, options in PATIENT_CHOICES.items()})
+    patient['Oldpeak'] = round(rng.uniform(0.0, 3.6), 1)
+    return patient
+
+
+async def client(host, port, requests, latencies, errors, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            body = json.dumps(random_patient(rng)).encode()
+            request = (f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                       f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.decode('latin-1').split('\r\n'):
+                if line.lower().startswith('content-length:'):
+                    length = int(line.split(':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b'HTTP/1.1 200'):
+                errors.append(head.split(b'\r\n', 1)[0].decode())
+    finally:
+        writer.close()
+
+
+async def run(host, port, concurrency, total_requests):
+    latencies, errors = [], []
+    per_client = max(1, total_requests // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, per_client, latencies, errors, seed)
+                           for seed in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {f'p{q}': round(float(np.percentile(latencies_ms, q)), 3) for q in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.host, args.port, args.concurrency, args.requests)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
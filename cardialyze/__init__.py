@@ -0,0 +1 @@
+"""Shared helpers for the Cardialyze Streamlit pages."""
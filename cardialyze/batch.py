@@ -0,0 +1,79 @@
+"""Chunked bulk scoring of patient CSV files.
+
+Only one chunk of the input is held in memory at a time: each chunk is
+encoded column-wise, scored with a single ``predict_proba`` call and written
+straight to the output before the next chunk is read. Each chunk is first
+looked up in the shared prediction cache (``PredictionCache.get_many``), so
+patients already scored interactively are not scored again and only the
+misses reach the model. The lookup never adds to the cache: one chunk is as
+large as the whole cache and would evict every interactive patient.
+
+On request, every row also gets its feature contributions (see
+cardialyze.contributions), computed for the whole chunk in the same call
+that yields its probabilities.
+"""
+import pandas as pd
+
+from cardialyze.contributions import CONTRIBUTION_COLUMNS, predict_contributions, probabilities
+from cardialyze.features import encode_frame
+from cardialyze.prediction_cache import get_prediction_cache
+from cardialyze.tracing import traced
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+
+def score_frame(entry, df, cache=None):
+    """Return the cardiac arrest probability (0-1) for every row of a labelled DataFrame.
+
+    ``entry`` is the loaded model from ``cardialyze.model_registry``. Rows
+    found in ``cache`` (the shared prediction cache by default) are not scored.
+    """
+    X = encode_frame(df)
+    cache = get_prediction_cache() if cache is None else cache
+    scores, _, missing = cache.get_many(entry, X)
+    if missing.any():
+        scores[missing] = entry.predictor.predict_proba(X[missing])[:, 1]
+    return scores
+
+
+def explain_frame(entry, df, cache=None):
+    """Probabilities and a DataFrame of contributions (``CONTRIBUTION_COLUMNS``) for a labelled DataFrame."""
+    X = encode_frame(df)
+    cache = get_prediction_cache() if cache is None else cache
+    scores, contributions, missing = cache.get_many(entry, X, explain=True)
+    if missing.any():
+        contributions[missing] = predict_contributions(entry, X[missing])
+        scores[missing] = probabilities(contributions[missing])
+    return scores, pd.DataFrame(contributions, columns=CONTRIBUTION_COLUMNS, index=df.index)
+
+
+def iter_scored_chunks(source, entry, chunk_rows=DEFAULT_CHUNK_ROWS, contributions=False):
+    """Yield the input chunks of a CSV with an added ``Result`` column (percent, 2 decimals).
+
+    With ``contributions`` a ``<feature> Contribution`` column (log-odds) is
+    added for every feature and the bias.
+    """
+    for chunk in pd.read_csv(source, chunksize=chunk_rows):
+        if contributions:
+            scores, explained = explain_frame(entry, chunk)
+            chunk['Result'] = (scores * 100).round(2)
+            chunk[[f'{column} Contribution' for column in CONTRIBUTION_COLUMNS]] = explained.round(4).to_numpy()
+        else:
+            chunk['Result'] = (score_frame(entry, chunk) * 100).round(2)
+        yield chunk
+
+
+@traced('bulk_score')
+def score_csv(source, dest, entry, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None, contributions=False):
+    """Score a CSV file chunk by chunk into the binary file object ``dest``.
+
+    ``progress`` is called with the number of rows scored so far after each
+    chunk. Returns the total number of rows scored.
+    """
+    rows = 0
+    for chunk in iter_scored_chunks(source, entry, chunk_rows, contributions):
+        dest.write(chunk.to_csv(index=False, header=rows == 0).encode('utf-8'))
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows)
+    return rows
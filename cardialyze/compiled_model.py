@@ -0,0 +1,153 @@
+"""Array-compiled evaluator for the XGBoost tree ensemble.
+
+For a single patient, ``XGBClassifier.predict_proba`` spends most of its time
+on wrapper validation, DMatrix construction and thread dispatch rather than
+walking the 23 shallow trees. This module exports the booster once into flat
+NumPy arrays (feature index, threshold, child pointers, leaf value, default
+direction) and evaluates rows directly from them, advancing every
+(row, tree) pair one level per step.
+
+Tree traversal runs single-threaded, so for large batches XGBoost's own
+multi-threaded predictor is faster; ``predict_proba`` hands batches of
+``LARGE_BATCH_ROWS`` or more back to the original model when it is known.
+
+Only plain ``gbtree`` boosters with numerical splits and a ``binary:logistic``
+objective are supported, which is what the app ships.
+"""
+import json
+
+import numpy as np
+
+# Rows evaluated per step, bounds the (rows x trees) working arrays for large batches
+CHUNK_ROWS = 4096
+
+# Batches at least this large are scored by the original XGBoost model, if available
+LARGE_BATCH_ROWS = 1000
+
+
+class CompiledEnsemble:
+    def __init__(self, feature, threshold, left, right, default_left, leaf_value, roots, max_depth, base_margin,
+                 num_features, model=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_margin = base_margin
+        self.num_features = num_features
+        self.model = model
+        # Interleaved (left, right) pairs, so the next node is a single gather at 2 * node + go_right
+        self._children = np.column_stack([left, right]).ravel().astype(np.intp)
+
+    @classmethod
+    def from_model(cls, model):
+        """Compile an ``XGBClassifier`` (or a raw ``xgboost.Booster``)."""
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        compiled = cls.from_json(json.loads(booster.save_raw('json')))
+        if hasattr(model, 'predict_proba'):
+            compiled.model = model
+        return compiled
+
+    @classmethod
+    def from_json(cls, model_json):
+        learner = model_json['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Unsupported objective: {objective}")
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster: {booster['name']}")
+
+        params = learner['learner_model_param']
+        # Stored as a probability, e.g. "5E-1" or "[4.9648392E-1]" depending on the XGBoost version
+        base_score = float(params['base_score'].strip('[]'))
+        base_margin = float(np.log(base_score / (1 - base_score)))
+        num_features = int(params['num_feature'])
+
+        trees = booster['model']['trees']
+        features, thresholds, lefts, rights, defaults, leaves, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree.get('split_type', [])):
+                raise ValueError("Categorical splits are not supported")
+            left = np.asarray(tree['left_children'], dtype=np.int32)
+            right = np.asarray(tree['right_children'], dtype=np.int32)
+            is_leaf = left == -1
+            node_ids = np.arange(len(left), dtype=np.int32)
+
+            # Leaves point at themselves, so extra traversal steps are harmless
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            features.append(np.where(is_leaf, 0, tree['split_indices']).astype(np.int32))
+            thresholds.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            defaults.append(np.asarray(tree['default_left'], dtype=bool))
+            # For leaves, split_conditions holds the leaf weight
+            leaves.append(np.where(is_leaf, tree['split_conditions'], 0.0).astype(np.float32))
+            roots.append(offset)
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += len(left)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            default_left=np.concatenate(defaults),
+            leaf_value=np.concatenate(leaves),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            base_margin=base_margin,
+            num_features=num_features,
+        )
+
+    def predict_margin(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.num_features:
+            raise ValueError(f"Expected an array of shape (n, {self.num_features}), got {X.shape}")
+        margin = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            margin[start:start + CHUNK_ROWS] = self._margin_chunk(X[start:start + CHUNK_ROWS])
+        return margin
+
+    def _margin_chunk(self, X):
+        n = len(X)
+        # Feature-major copy, so the value for (row, feature) sits at feature * n + row
+        values = np.ascontiguousarray(X.T).ravel()
+        feature_offset = self.feature.astype(np.intp) * n
+        row_offset = np.arange(n, dtype=np.intp)[:, None]
+        has_missing = np.isnan(X).any()
+
+        node = np.broadcast_to(self.roots.astype(np.intp), (n, len(self.roots)))
+        for _ in range(self.max_depth):
+            value = values.take(feature_offset.take(node) + row_offset)
+            # XGBoost sends x < threshold left, and missing values along the default branch
+            go_right = ~(value < self.threshold.take(node))
+            if has_missing:
+                go_right = np.where(np.isnan(value), ~self.default_left.take(node), go_right)
+            node = self._children.take(2 * node + go_right)
+        # Sum leaf weights in float32 like XGBoost does, then add the base margin
+        return self.leaf_value.take(node).sum(axis=1, dtype=np.float32) + self.base_margin
+
+    def evaluate(self, X):
+        """Probabilities P(0), P(1) computed from the compiled arrays only."""
+        positive = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict_proba(self, X):
+        """Drop-in for ``XGBClassifier.predict_proba``: columns P(0), P(1)."""
+        if self.model is not None and len(X) >= LARGE_BATCH_ROWS:
+            return self.model.predict_proba(X)
+        return self.evaluate(X)
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    # Children always have higher ids than their parent in XGBoost's layout
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
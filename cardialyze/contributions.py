@@ -0,0 +1,70 @@
+"""Per-feature contributions of a prediction (XGBoost's TreeSHAP).
+
+``Booster.predict(..., pred_contribs=True)`` returns one log-odds
+contribution per feature plus a bias column, and the row sum is the model's
+margin. The probability is the sigmoid of that sum. One call therefore
+gives both the result and its explanation, so explained predictions do not
+also run ``predict_proba``.
+
+Contributions are in log-odds. Positive values push the risk up, negative
+values pull it down, and the bias is the model's average margin.
+"""
+import numpy as np
+
+from cardialyze.features import FEATURE_COLUMNS
+from cardialyze.startup import lazy_import
+
+go = lazy_import('plotly.graph_objects')
+
+BIAS = 'Bias'
+
+# Columns of a contribution matrix
+CONTRIBUTION_COLUMNS = FEATURE_COLUMNS + [BIAS]
+
+
+def predict_contributions(entry, X, nthread=None):
+    """Contribution matrix, shape ``(len(X), len(CONTRIBUTION_COLUMNS))``, of the loaded model ``entry``.
+
+    ``nthread`` limits the threads that build the DMatrix (all cores by default).
+    """
+    predictor = entry.predictor
+    if hasattr(predictor, 'predict_contributions'):
+        # Executor-bound predictor, see cardialyze.inference
+        return predictor.predict_contributions(X)
+    import xgboost as xgb
+
+    return entry.model.get_booster().predict(xgb.DMatrix(np.asarray(X, dtype=np.float64), nthread=nthread),
+                                             pred_contribs=True)
+
+
+def probabilities(contributions):
+    """P(cardiac arrest) of every row of a contribution matrix."""
+    return 1.0 / (1.0 + np.exp(-np.asarray(contributions, dtype=np.float64).sum(axis=1)))
+
+
+def waterfall_figure(contributions, record=None):
+    """Waterfall of one row of contributions, from the bias to the patient's margin.
+
+    ``record`` (keyed by ``FEATURE_COLUMNS``) adds the patient's values to the labels.
+    """
+    contributions = np.asarray(contributions, dtype=np.float64)
+    features = contributions[:-1]
+    # Largest effects first, so the bars read like a ranking
+    order = np.argsort(-np.abs(features))
+    labels = [f'{FEATURE_COLUMNS[i]} = {record[FEATURE_COLUMNS[i]]}' if record else FEATURE_COLUMNS[i]
+              for i in order]
+    probability = probabilities(contributions.reshape(1, -1))[0]
+
+    fig = go.Figure(go.Waterfall(
+        orientation='h',
+        measure=['absolute'] + ['relative'] * len(order) + ['total'],
+        y=['Average patient'] + labels + ['This patient'],
+        x=[contributions[-1]] + features[order].tolist() + [0.0],
+        increasing={'marker': {'color': 'crimson'}},
+        decreasing={'marker': {'color': 'seagreen'}},
+        totals={'marker': {'color': 'slategray'}},
+        texttemplate='%{delta:+.2f}',
+    ))
+    fig.update_layout(title=f'What drives the {probability * 100:.2f}% risk', xaxis_title='Log-odds of cardiac arrest',
+                      yaxis={'autorange': 'reversed'}, showlegend=False, height=140 + 28 * len(order))
+    return fig
@@ -0,0 +1,94 @@
+"""Count cube of the Dataset page's categorical attributes against Gender and output.
+
+Every categorical attribute of the reference dataset is counted once against
+``Gender`` and ``output`` into a dense ``(attribute, Gender, output)`` array.
+Any Sankey over these dimensions (attribute -> Gender, attribute -> Gender ->
+output, ...) is then a few sums over that small array, so switching the
+attribute or adding a level never scans the dataset again.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Dimensions every attribute is counted against, in cube axis order after the attribute itself
+AXES = ('Gender', 'output')
+
+
+@dataclass(frozen=True)
+class SankeyArrays:
+    labels: List[str]
+    source: np.ndarray
+    target: np.ndarray
+    value: np.ndarray
+
+
+class CountCube:
+    def __init__(self, counts: Dict[str, np.ndarray], categories: Dict[str, List[str]]):
+        # counts[attribute] has shape (len(categories[attribute]), len(categories['Gender']), len(categories['output']))
+        self.counts = counts
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, df, attributes=None):
+        """Count ``attributes`` (all categorical columns but the axes by default) against ``AXES``.
+
+        Each attribute takes one ``np.bincount`` over combined category codes.
+        """
+        if attributes is None:
+            attributes = [col for col in df.columns
+                          if col not in AXES and isinstance(df[col].dtype, pd.CategoricalDtype)]
+        categories = {col: list(df[col].cat.categories) for col in list(attributes) + list(AXES)}
+        axis_codes = [df[axis].cat.codes.to_numpy(dtype=np.int64) for axis in AXES]
+        axis_sizes = [len(categories[axis]) for axis in AXES]
+
+        # Rows with a missing value in any dimension are left out, like groupby does
+        valid = np.logical_and.reduce([codes >= 0 for codes in axis_codes])
+        axis_index = np.ravel_multi_index([codes[valid] for codes in axis_codes], axis_sizes)
+        counts = {}
+        for attribute in attributes:
+            codes = df[attribute].cat.codes.to_numpy(dtype=np.int64)[valid]
+            keep = codes >= 0
+            shape = (len(categories[attribute]), *axis_sizes)
+            flat = codes[keep] * int(np.prod(axis_sizes)) + axis_index[keep]
+            counts[attribute] = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(counts, categories)
+
+    @property
+    def attributes(self):
+        return list(self.counts)
+
+    def marginal(self, attribute, dims: Tuple[str, ...]):
+        """Counts of ``attribute``'s cube summed down to ``dims`` (in that axis order)."""
+        names = (attribute, *AXES)
+        cube = self.counts[attribute]
+        summed = cube.sum(axis=tuple(i for i, name in enumerate(names) if name not in dims))
+        kept = [name for name in names if name in dims]
+        return np.transpose(summed, [kept.index(dim) for dim in dims])
+
+    def sankey(self, attribute, levels=('Gender',)):
+        """Node labels and link arrays for ``attribute`` -> ``levels[0]`` -> ``levels[1]`` ...
+
+        Only categories that occur get a node, and links with a zero count are dropped.
+        """
+        path = (attribute, *levels)
+        offsets, labels, node_ids = 0, [], {}
+        for dim in path:
+            totals = self.marginal(attribute, (dim,))
+            present = np.flatnonzero(totals)
+            # Node id of each category of this level, -1 for categories without any rows
+            ids = np.full(len(totals), -1, dtype=np.int64)
+            ids[present] = offsets + np.arange(len(present))
+            node_ids[dim] = ids
+            labels.extend(str(self.categories[dim][code]) for code in present)
+            offsets += len(present)
+
+        sources, targets, values = [], [], []
+        for left, right in zip(path, path[1:]):
+            counts = self.marginal(attribute, (left, right))
+            left_codes, right_codes = np.nonzero(counts)
+            sources.append(node_ids[left][left_codes])
+            targets.append(node_ids[right][right_codes])
+            values.append(counts[left_codes, right_codes])
+        return SankeyArrays(labels, np.concatenate(sources), np.concatenate(targets), np.concatenate(values))
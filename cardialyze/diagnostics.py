@@ -0,0 +1,61 @@
+"""Diagnostics view of the spans recorded by cardialyze.tracing.
+
+Not listed in the page navigation: the Dashboard renders it instead of its
+normal content when opened with ``?diagnostics=1`` in the URL.
+"""
+import pandas as pd
+import streamlit as st
+
+from cardialyze.inference import current_inference_executor
+from cardialyze.prediction_cache import get_prediction_cache
+from cardialyze.startup import prewarm_timings
+from cardialyze.tracing import TRACING, tracer
+
+
+def render():
+    st.title("Diagnostics")
+    prediction_cache = get_prediction_cache()
+    st.write(f"Prediction cache: {len(prediction_cache):,} entries, {prediction_cache.hits:,} hits, "
+             f"{prediction_cache.misses:,} misses (hit rate {prediction_cache.hit_rate:.0%}).")
+    # Reading the stats must not start the worker pool
+    executor = current_inference_executor()
+    if executor is None:
+        st.write("Inference executor: not started (no prediction since the server started).")
+    else:
+        st.write(f"Inference executor: {executor.workers} workers x {executor.threads_per_worker} threads, "
+                 f"{executor.queued}/{executor.max_queue} queued, {executor.batches:,} batches of "
+                 f"{executor.mean_batch_requests:.1f} requests on average, {executor.rejected:,} rejected, "
+                 f"{executor.timed_out:,} timed out.")
+
+    if not TRACING:
+        st.info("Tracing is disabled (CARDIALYZE_TRACING=0).")
+        return
+
+    sessions = tracer.sessions()
+    session = st.selectbox("Session:", [None] + sessions,
+                           format_func=lambda value: "All sessions" if value is None else value)
+
+    stats = pd.DataFrame(tracer.stats(session))
+    st.write(f"{len(tracer.snapshot(session)):,} spans recorded (last {tracer.records.maxlen:,} are kept).")
+    if stats.empty:
+        return
+
+    # Seconds -> milliseconds for display
+    for column in ('sum', 'p50', 'p95', 'p99'):
+        stats[column] = stats[column] * 1000
+    st.dataframe(stats.rename(columns={'sum': 'total ms', 'p50': 'p50 ms', 'p95': 'p95 ms', 'p99': 'p99 ms'}),
+                 hide_index=True, column_config={column: st.column_config.NumberColumn(format="%.2f")
+                                                 for column in ('total ms', 'p50 ms', 'p95 ms', 'p99 ms')})
+
+    if prewarm_timings:
+        st.write("Background pre-warm:", {name: f"{value * 1000:.0f} ms" if isinstance(value, float) else str(value)
+                                          for name, value in prewarm_timings.items()})
+
+    prometheus_col, jsonl_col, clear_col = st.columns(3)
+    prometheus_col.download_button("Export Prometheus text", tracer.to_prometheus(session),
+                                   file_name="cardialyze_spans.prom", mime="text/plain")
+    jsonl_col.download_button("Export JSON lines", "".join(tracer.iter_jsonl(session)),
+                              file_name="cardialyze_spans.jsonl", mime="application/x-ndjson")
+    if clear_col.button("Clear recorded spans"):
+        tracer.clear()
+        st.rerun()
@@ -0,0 +1,237 @@
+"""Chunked export of the prognosis history as CSV, Parquet or JSON lines.
+
+Exports are generated by ``iter_export()``, which reads the history in
+chunks of ``CHUNK_ROWS`` tests (``HistoryStore.iter_query``, filters
+applied in SQL) and yields the encoded bytes of each chunk. No DataFrame or
+encoded output is ever larger than one chunk, and Parquet gets one row
+group per chunk.
+
+Streamlit cannot stream a download: it reads the whole file into its
+media store and keeps it there while the page shows the button. The pages
+therefore generate an export only when the button is clicked, write its
+chunks to a temporary file that spills to disk beyond ``SPOOL_BYTES``
+(``export_file()``, a ``DownloadFile``), and hand that file to Streamlit, which then holds the
+only full copy in memory. In-app exports are limited to
+``MAX_APP_EXPORT_ROWS`` tests. An export takes about 25 bytes per test as
+Parquet, 140 as CSV and 380 as JSON lines, so with the default limit one
+export holds at most about 20 MB per session, plus one chunk while it is
+generated. Larger exports, such as a year of tests for compliance, go
+through the command line, which streams straight to a file with the memory
+of a single chunk::
+
+    python -m cardialyze.export history-2024.parquet --since 2024-01-01 --until 2024-12-31
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, time as day_time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from cardialyze.history_store import COLUMNS, MAX_TEST, TIMEZONE, HistoryStore, get_history_store
+
+CHUNK_ROWS = 10_000
+
+MAX_APP_EXPORT_ROWS = int(os.environ.get("CARDIALYZE_EXPORT_MAX_ROWS", 50_000))
+
+# Bytes of a generated download kept in memory before the temporary file moves to disk
+SPOOL_BYTES = 1 << 20
+
+# Largest generated file (such as a scored upload) the pages offer for download, Streamlit keeps it in memory
+MAX_APP_DOWNLOAD_BYTES = int(os.environ.get("CARDIALYZE_DOWNLOAD_MAX_MB", 20)) << 20
+
+# Format -> (file suffix, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'JSON lines': ('jsonl', 'application/x-ndjson'),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last ``drain()``."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets, so this counts every byte ever written
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _iter_parquet(chunks, empty):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=True)
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=True)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        # Nothing matched: still a valid file with the history's columns
+        writer = pq.ParquetWriter(sink, pa.Table.from_pandas(empty(), preserve_index=True).schema)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(store, export_format, columns=None, filters=None, chunk_rows=CHUNK_ROWS):
+    """Yield the filtered history in ``export_format`` (a key of ``EXPORT_FORMATS``) as chunks of bytes."""
+    chunks = store.iter_query(columns, filters, chunk_rows)
+    if export_format == 'Parquet':
+        yield from _iter_parquet(chunks, lambda: store.query(columns, filters, limit=0))
+    elif export_format == 'CSV':
+        header = True
+        for chunk in chunks:
+            yield chunk.to_csv(header=header).encode('utf-8')
+            header = False
+        if header:
+            yield store.query(columns, filters, limit=0).to_csv().encode('utf-8')
+    elif export_format == 'JSON lines':
+        for chunk in chunks:
+            yield chunk.reset_index().to_json(orient='records', lines=True, force_ascii=False).encode('utf-8')
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+
+class DownloadFile(io.RawIOBase):
+    """Temporary file for a generated download, in memory up to ``SPOOL_BYTES`` and on disk beyond.
+
+    ``st.download_button`` only accepts a few file types, so this wraps a
+    ``SpooledTemporaryFile`` as a raw file. ``read()`` returns the rest of
+    the file in one piece. The file is deleted when this object is closed
+    or garbage collected.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readall(self):
+        return self._file.read()
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+def export_file(store, export_format, columns=None, filters=None):
+    """The whole export as a rewound ``DownloadFile``, for ``st.download_button``.
+
+    Only for up to ``MAX_APP_EXPORT_ROWS`` tests: Streamlit reads the file
+    back into memory.
+    """
+    download = DownloadFile()
+    for data in iter_export(store, export_format, columns, filters):
+        download.write(data)
+    download.seek(0)
+    return download
+
+
+def download_section(store, columns, filters, total_matches, key, file_stem='cardialyze_history'):
+    """Format picker and download button for the matching tests, or the CLI command when there are too many."""
+    import streamlit as st
+
+    format_col, button_col = st.columns([1, 2])
+    export_format = format_col.selectbox('Export format', list(EXPORT_FORMATS), key=f'{key}_format')
+    suffix, mime = EXPORT_FORMATS[export_format]
+    if total_matches > MAX_APP_EXPORT_ROWS:
+        button_col.info(f"{total_matches:,} tests are more than the app exports at once ({MAX_APP_EXPORT_ROWS:,}). "
+                        f"Use `python -m cardialyze.export {file_stem}.{suffix}` on the server.")
+        return
+    # Generated only when clicked, not on every rerun
+    button_col.download_button(f"Download {total_matches:,} tests", key=f'{key}_download',
+                               data=lambda: export_file(store, export_format, columns, filters),
+                               file_name=f'{file_stem}.{suffix}', mime=mime, on_click='ignore',
+                               disabled=not total_matches)
+
+
+def _epoch(day, end_of_day=False):
+    moment = datetime.combine(datetime.strptime(day, '%Y-%m-%d').date(), day_time.max if end_of_day else day_time.min,
+                              ZoneInfo(TIMEZONE))
+    return int(moment.timestamp())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the prognosis history without loading it into memory.")
+    parser.add_argument('dest', type=Path, help="output file, .csv, .parquet or .jsonl (- for CSV on stdout)")
+    parser.add_argument('--db', type=Path, help="history database (default: the app's)")
+    parser.add_argument('--since', help="first day to include, YYYY-MM-DD (local time)")
+    parser.add_argument('--until', help="last day to include, YYYY-MM-DD (local time)")
+    parser.add_argument('--ic-number', help="only tests of this identification number")
+    parser.add_argument('--owner', help="only tests of this owner, e.g. user:<email> (default: every owner)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    suffixes = {suffix: name for name, (suffix, _) in EXPORT_FORMATS.items()}
+    suffix = 'csv' if str(args.dest) == '-' else args.dest.suffix.lower().lstrip('.')
+    if suffix not in suffixes:
+        parser.error(f"Unsupported output format .{suffix} (use .csv, .parquet or .jsonl)")
+
+    filters = []
+    if args.since or args.until:
+        filters.append(('Timestamp', 'between', (_epoch(args.since) if args.since else 0,
+                                                 _epoch(args.until, True) if args.until else MAX_TEST)))
+    if args.ic_number:
+        filters.append(('IC Number', 'in', [args.ic_number]))
+
+    store = HistoryStore(args.db) if args.db else get_history_store()
+    if args.owner is not None:
+        store = store.for_owner(args.owner)
+    output = sys.stdout.buffer if str(args.dest) == '-' else open(args.dest, 'wb')
+    try:
+        for data in iter_export(store, suffixes[suffix], list(COLUMNS), filters, args.chunk_rows):
+            output.write(data)
+        print(f"Exported {store.count(filters):,} tests to {args.dest}", file=sys.stderr)
+    finally:
+        store.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Feature layout and categorical encoding shared by every page.
+
+The model codes here are the ones ``calculate_prediction()`` on the Prognose
+page has always fed to the model, so anything encoded with this module scores
+exactly like a patient entered through the widgets.
+
+Two vocabularies meet in this app: the labels shown in the UI and stored in
+the history ("Male", "Asymptomatic", ...), and the raw codes of the UCI
+files behind ``OHCA.csv`` (``sex``, ``cp`` 1-4, ``slope`` 1-3, ...). Both are
+converted through precomputed lookup arrays and ``pd.Categorical`` codes, so
+whole columns are encoded or decoded in one vectorized pass.
+"""
+import numpy as np
+import pandas as pd
+
+# Column order expected by the model
+FEATURE_COLUMNS = ['Age', 'Gender', 'Chest Pain Type', 'Resting Blood Pressure', 'Serum Cholesterol',
+                   'Fasting Blood Sugar', 'ECG Result', 'Max Heart Rate', 'Exercise Angina', 'Oldpeak', 'ST Slope']
+
+# Category labels, listed in the order of their model code (label at position i is encoded as i)
+CATEGORIES = {
+    'Gender': ['Female', 'Male'],
+    'Chest Pain Type': ['Typical Angina', 'Atypical Angina', 'Non-Anginal Pain', 'Asymptomatic'],
+    'Fasting Blood Sugar': ['Below 120', 'Above 120'],
+    'ECG Result': ['Normal', 'ST-T Wave Abnormality', 'Left Ventricular Hypertrophy'],
+    'Exercise Angina': ['No', 'Yes'],
+    'ST Slope': ['Upsloping', 'Flat', 'Downsloping'],
+}
+
+CATEGORY_DTYPES = {col: pd.CategoricalDtype(labels) for col, labels in CATEGORIES.items()}
+
+# Option order of the Prognose form's select boxes. It is independent of the codes: the form has always
+# listed Male and Yes first (and defaults to Male), while the model encodes Female and No as 0
+FORM_OPTIONS = {**CATEGORIES, 'Gender': ['Male', 'Female'], 'Exercise Angina': ['Yes', 'No']}
+
+# Allowed (min, max) of the numeric inputs, as enforced by the Prognose form
+NUMERIC_BOUNDS = {
+    'Age': (28, 77),
+    'Resting Blood Pressure': (92, 170),
+    'Serum Cholesterol': (85, 394),
+    'Max Heart Rate': (80, 202),
+    'Oldpeak': (0.0, 3.6),
+}
+
+# Label -> code lookups for encoding one record at a time
+CODES = {col: {label: code for code, label in enumerate(labels)} for col, labels in CATEGORIES.items()}
+
+# Raw OHCA.csv / UCI column for every model feature
+SOURCE_COLUMNS = {
+    'age': 'Age', 'sex': 'Gender', 'cp': 'Chest Pain Type', 'trestbps': 'Resting Blood Pressure',
+    'chol': 'Serum Cholesterol', 'fbs': 'Fasting Blood Sugar', 'restecg': 'ECG Result', 'thalach': 'Max Heart Rate',
+    'exang': 'Exercise Angina', 'oldpeak': 'Oldpeak', 'slope': 'ST Slope',
+}
+
+# First raw code of each categorical source column: cp and slope count from 1 in the UCI files,
+# sex uses 1 = Male, the others already match the model codes
+SOURCE_CODE_OFFSETS = {'sex': 0, 'cp': 1, 'fbs': 0, 'restecg': 0, 'exang': 0, 'slope': 1}
+
+# Labels of the binarized target (any UCI diagnosis above 0 counts as presence)
+OUTPUT_LABELS = ['No Presence', 'Presence']
+OUTPUT_DTYPE = pd.CategoricalDtype(OUTPUT_LABELS)
+
+
+def encode_record(record):
+    """Encode one patient dict (keyed by ``FEATURE_COLUMNS``) into a feature row.
+
+    Raises ``ValueError`` for missing fields, unknown labels or non-numeric values.
+    """
+    row = np.empty(len(FEATURE_COLUMNS), dtype=np.float64)
+    for i, col in enumerate(FEATURE_COLUMNS):
+        if col not in record:
+            raise ValueError(f"Missing field: {col}")
+        value = record[col]
+        if col in CODES:
+            if value not in CODES[col]:
+                raise ValueError(f"Unknown value for {col}: {value!r} (expected one of {', '.join(CATEGORIES[col])})")
+            row[i] = CODES[col][value]
+        else:
+            try:
+                row[i] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{col} must be a number, got {value!r}") from None
+    return row
+
+
+def category_codes(series, col):
+    """Model codes for a column of labels; -1 marks labels outside the vocabulary."""
+    if series.dtype == CATEGORY_DTYPES[col]:
+        return series.cat.codes.to_numpy()
+    return pd.Categorical(series, dtype=CATEGORY_DTYPES[col]).codes
+
+
+def encode_frame(df):
+    """Encode a labelled patient DataFrame into the model's float feature matrix.
+
+    Categorical columns are converted with one vectorized Categorical lookup per
+    column. Raises ``ValueError`` for missing columns or unknown labels.
+    """
+    missing = [col for col in FEATURE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    matrix = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, col in enumerate(FEATURE_COLUMNS):
+        if col in CATEGORIES:
+            codes = category_codes(df[col], col)
+            if (codes < 0).any():
+                bad = df[col][codes < 0]
+                raise ValueError(f"Unknown value(s) for {col}: {', '.join(map(str, bad.unique()[:5]))} "
+                                 f"(first at row {bad.index[0] + 1})")
+            matrix[:, i] = codes
+        else:
+            matrix[:, i] = pd.to_numeric(df[col], errors='raise')
+    return matrix
+
+
+def decode_codes(codes, col):
+    """Categorical of labels for an array of model codes of one column (-1 decodes to NaN)."""
+    return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int64), dtype=CATEGORY_DTYPES[col])
+
+
+def decode_matrix(matrix):
+    """Labelled DataFrame (categorical dtypes) for a model feature matrix."""
+    matrix = np.asarray(matrix)
+    data = {}
+    for i, col in enumerate(FEATURE_COLUMNS):
+        data[col] = decode_codes(matrix[:, i], col) if col in CATEGORIES else matrix[:, i]
+    return pd.DataFrame(data)
+
+
+def source_codes(series, source_col):
+    """Model codes for a raw UCI categorical column (e.g. ``cp`` 1-4 -> 0-3), -1 if out of range."""
+    codes = np.asarray(series, dtype=np.int64) - SOURCE_CODE_OFFSETS[source_col]
+    size = len(CATEGORIES[SOURCE_COLUMNS[source_col]])
+    return np.where((codes >= 0) & (codes < size), codes, -1)
+
+
+def encode_source_frame(df):
+    """Encode a raw OHCA.csv-layout DataFrame into the model's float feature matrix."""
+    missing = [col for col in SOURCE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    matrix = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, (source_col, col) in enumerate(SOURCE_COLUMNS.items()):
+        if col in CATEGORIES:
+            codes = source_codes(df[source_col], source_col)
+            if (codes < 0).any():
+                bad = df[source_col][codes < 0]
+                raise ValueError(f"Unknown code(s) for {source_col}: {', '.join(map(str, bad.unique()[:5]))} "
+                                 f"(first at row {bad.index[0] + 1})")
+            matrix[:, i] = codes
+        else:
+            matrix[:, i] = pd.to_numeric(df[source_col], errors='raise')
+    return matrix
+
+
+def decode_output(series):
+    """Categorical of "No Presence" / "Presence" for a raw UCI target column."""
+    return pd.Categorical.from_codes((np.asarray(series) > 0).astype(np.int64), dtype=OUTPUT_DTYPE)
+
+
+def label_source_frame(df):
+    """Copy of a raw OHCA.csv-layout DataFrame with readable categorical columns.
+
+    ``cp``, ``fbs``, ``restecg``, ``exang`` and ``slope`` are replaced by their
+    labels and a ``Gender`` column is added next to the numeric ``sex``.
+    """
+    labelled = df.copy()
+    for source_col in SOURCE_CODE_OFFSETS:
+        if source_col not in labelled.columns:
+            continue
+        labels = decode_codes(source_codes(labelled[source_col], source_col), SOURCE_COLUMNS[source_col])
+        labelled['Gender' if source_col == 'sex' else source_col] = labels
+    return labelled
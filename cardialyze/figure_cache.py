@@ -0,0 +1,87 @@
+"""Process-wide LRU cache for Plotly figures.
+
+Figures are keyed by the chart kind and a fingerprint of the data they are
+built from, so a rerun that shows unchanged data reuses the figure instead
+of rebuilding it with Plotly Express. Charts of the prognosis history use
+``query_fingerprint()``, which describes the rows without reading them. Entries are evicted least recently
+used first once either the entry limit or the memory cap is exceeded.
+
+Cached figures are shared between sessions and must be treated as read-only.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from cardialyze.tracing import span
+
+MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRIES = 256
+
+
+def query_fingerprint(owner, state, filters):
+    """Hash of the history rows of ``owner`` selected by ``filters`` when the store was at ``state`` (``HistoryStore.state()``)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((owner, tuple(state), filters)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, kind, fingerprint, build):
+        """Return the cached figure for ``(kind, fingerprint)``, calling ``build()`` on a miss."""
+        key = (kind, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Build outside the lock, two sessions racing on the same key just build it twice
+        with span(f'figure {kind[0] if isinstance(kind, tuple) else kind}'):
+            figure = build()
+            # Size of the serialized figure, which is also what gets sent to the browser
+            size = len(figure.to_json())
+        if size > self.max_bytes:
+            return figure
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[key] = (figure, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_figure_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FigureCache()
+    return _cache
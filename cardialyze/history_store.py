@@ -0,0 +1,444 @@
+"""Durable prognosis history backed by SQLite.
+
+Every calculated prognosis is appended to one table with typed columns:
+the timestamp is stored as epoch seconds, the result as a float percentage
+and the categorical inputs as their model codes (see cardialyze.features).
+Timestamp, IC number, result and age are indexed, and pages ask only for the
+rows and columns they display, so rendering cost no longer grows with the
+size of the whole history.
+
+Each test's feature contributions (see cardialyze.contributions), when the
+page computed them, go to a side table keyed by the test number. Tests
+recorded before contributions existed simply have no row there.
+
+Running aggregates of the results (count, min, max, sum, sum of squares)
+and per-category counts are kept in small side tables that are updated in
+the same transaction as each append, so unfiltered dashboard metrics are a
+single-row read instead of a scan.
+
+Every test belongs to an owner, and pages only ever see the current
+viewer's tests (``session_history()``): the signed-in user when the app
+runs with Streamlit authentication, otherwise the browser session, which
+like the old in-memory history starts empty and is not visible to anyone
+else. ``CARDIALYZE_HISTORY_OWNER`` puts every viewer under one owner, for
+single-clinic installations that already sit behind a login. The owner is
+part of every filter and the aggregates are kept per owner.
+
+All sessions share one connection, guarded by a lock, so the store holds
+a single file handle however many rerun threads Streamlit starts, and
+``close()`` releases it. The database runs in WAL mode so the export
+command line and other processes can read while the app appends.
+"""
+import atexit
+import copy
+import os
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from cardialyze.contributions import BIAS, CONTRIBUTION_COLUMNS
+from cardialyze.features import CATEGORIES, CODES, FEATURE_COLUMNS, decode_codes
+from cardialyze.tracing import traced
+
+HISTORY_PATH = Path(os.environ.get("CARDIALYZE_HISTORY_DB",
+                                   Path(__file__).resolve().parent.parent / "history.db"))
+
+TIMEZONE = 'Asia/Kuala_Lumpur'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# History column -> SQL column, in display order
+COLUMNS = {
+    'Timestamp': 'timestamp',
+    'Name': 'name',
+    'IC Number': 'ic_number',
+    'Age': 'age',
+    'Gender': 'gender',
+    'Chest Pain Type': 'chest_pain_type',
+    'Resting Blood Pressure': 'resting_blood_pressure',
+    'Serum Cholesterol': 'serum_cholesterol',
+    'Fasting Blood Sugar': 'fasting_blood_sugar',
+    'ECG Result': 'ecg_result',
+    'Max Heart Rate': 'max_heart_rate',
+    'Exercise Angina': 'exercise_angina',
+    'Oldpeak': 'oldpeak',
+    'ST Slope': 'st_slope',
+    'Result': 'result',
+}
+
+# Largest test number (SQLite rowid), the open upper bound of test ranges
+MAX_TEST = 2 ** 63 - 1
+
+# Contribution column -> SQL column of the history_contributions table
+CONTRIBUTION_SQL_COLUMNS = {**{column: COLUMNS[column] for column in FEATURE_COLUMNS}, BIAS: 'bias'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL DEFAULT '',
+    timestamp INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    ic_number TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    gender INTEGER NOT NULL,
+    chest_pain_type INTEGER NOT NULL,
+    resting_blood_pressure INTEGER NOT NULL,
+    serum_cholesterol INTEGER NOT NULL,
+    fasting_blood_sugar INTEGER NOT NULL,
+    ecg_result INTEGER NOT NULL,
+    max_heart_rate INTEGER NOT NULL,
+    exercise_angina INTEGER NOT NULL,
+    oldpeak REAL NOT NULL,
+    st_slope INTEGER NOT NULL,
+    result REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS history_ic_number ON history (ic_number);
+CREATE INDEX IF NOT EXISTS history_result ON history (result);
+CREATE INDEX IF NOT EXISTS history_age ON history (age);
+"""
+
+# Run after the owner column exists, which histories from before owners only get from the migration
+OWNER_SCHEMA = """
+CREATE INDEX IF NOT EXISTS history_owner ON history (owner, id);
+DROP TABLE IF EXISTS result_stats;
+DROP TABLE IF EXISTS category_counts;
+CREATE TABLE IF NOT EXISTS owner_result_stats (
+    owner TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sum REAL NOT NULL,
+    sum_sq REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS owner_category_counts (
+    owner TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (owner, feature, code)
+);
+"""
+
+UPDATE_RESULT_STATS = """
+INSERT INTO owner_result_stats (owner, count, min, max, sum, sum_sq) VALUES (?1, 1, ?2, ?2, ?2, ?2 * ?2)
+ON CONFLICT (owner) DO UPDATE SET
+    count = count + 1, min = MIN(min, excluded.min), max = MAX(max, excluded.max),
+    sum = sum + excluded.sum, sum_sq = sum_sq + excluded.sum_sq
+"""
+
+CONTRIBUTIONS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS history_contributions (
+    id INTEGER PRIMARY KEY REFERENCES history (id),
+    {', '.join(f'{sql_column} REAL NOT NULL' for sql_column in CONTRIBUTION_SQL_COLUMNS.values())}
+);
+"""
+
+INSERT_CONTRIBUTIONS = (f'INSERT INTO history_contributions (id, {", ".join(CONTRIBUTION_SQL_COLUMNS.values())}) '
+                        f'VALUES ({", ".join("?" * (len(CONTRIBUTION_SQL_COLUMNS) + 1))})')
+
+UPDATE_CATEGORY_COUNTS = """
+INSERT INTO owner_category_counts (owner, feature, code, count) VALUES (?, ?, ?, 1)
+ON CONFLICT (owner, feature, code) DO UPDATE SET count = count + 1
+"""
+
+
+@dataclass(frozen=True)
+class HistorySummary:
+    """Running aggregates over the whole history of a store's owner."""
+    count: int
+    min: Optional[float]
+    max: Optional[float]
+    sum: float
+    sum_sq: float
+    category_counts: Dict[str, Dict[str, int]]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def std(self) -> Optional[float]:
+        if not self.count:
+            return None
+        variance = self.sum_sq / self.count - (self.sum / self.count) ** 2
+        return max(variance, 0.0) ** 0.5
+
+    def counts(self, column):
+        """Category counts of one column as a DataFrame, largest first (like ``value_counts``)."""
+        counts = sorted(self.category_counts.get(column, {}).items(), key=lambda item: item[1], reverse=True)
+        return pd.DataFrame(counts, columns=[column, 'Count'])
+
+
+class HistoryStore:
+    """Tests of one owner, or of every owner when ``owner`` is None.
+
+    The unscoped store is for operator tools such as the export command
+    line; pages use ``session_history()``. ``for_owner()`` scopes a store
+    without opening another database.
+    """
+
+    def __init__(self, path=HISTORY_PATH, owner=None):
+        self.path = Path(path)
+        self.owner = owner
+        # Streamlit runs each rerun on its own thread; the lock serializes them on the one connection
+        self._database = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            # Histories written before owners existed keep their tests under the empty owner, which no viewer has
+            if 'owner' not in {row[1] for row in connection.execute('PRAGMA table_info(history)')}:
+                connection.execute("ALTER TABLE history ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            connection.executescript(OWNER_SCHEMA)
+            connection.executescript(CONTRIBUTIONS_SCHEMA)
+            # Histories written before the per-owner aggregate tables existed need one full pass
+            if connection.execute('SELECT COUNT(*) FROM owner_result_stats').fetchone()[0] == 0:
+                self._rebuild_aggregates(connection)
+
+    def for_owner(self, owner):
+        """This store restricted to the tests of ``owner``, sharing its database."""
+        scoped = copy.copy(self)
+        scoped.owner = owner
+        return scoped
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            yield self._database
+
+    def close(self):
+        """Close the database connection, which every ``for_owner()`` view of this store shares."""
+        with self._lock:
+            self._database.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _owned(self, table):
+        # WHERE clause and parameters selecting the owner's rows of an aggregate table
+        return ('', []) if self.owner is None else (f' WHERE {table}.owner = ?', [self.owner])
+
+    @traced('history_append')
+    def append(self, record, result, timestamp, contributions=None):
+        """Store one prognosis for the store's owner.
+
+        ``record`` holds the patient fields keyed like the history columns
+        (labels for categorical inputs), ``result`` is the probability in
+        percent and ``timestamp`` the time of the test in epoch seconds.
+        ``contributions`` is the optional row of feature contributions, in
+        ``CONTRIBUTION_COLUMNS`` order. Returns the id of the new row, which
+        is also its test number.
+        """
+        if self.owner is None:
+            raise ValueError("Tests can only be appended to a store scoped to an owner (for_owner)")
+        values = {'owner': self.owner, 'timestamp': int(timestamp), 'result': float(result)}
+        for column, sql_column in COLUMNS.items():
+            if sql_column in values:
+                continue
+            value = record[column]
+            values[sql_column] = CODES[column][value] if column in CODES else value
+
+        names = ', '.join(values)
+        placeholders = ', '.join('?' * len(values))
+        with self._connection() as connection:
+            with connection:
+                cursor = connection.execute(f'INSERT INTO history ({names}) VALUES ({placeholders})',
+                                            tuple(values.values()))
+                connection.execute(UPDATE_RESULT_STATS, (self.owner, values['result']))
+                connection.executemany(UPDATE_CATEGORY_COUNTS,
+                                       [(self.owner, column, values[COLUMNS[column]]) for column in CATEGORIES])
+                if contributions is not None:
+                    connection.execute(INSERT_CONTRIBUTIONS, (cursor.lastrowid, *map(float, contributions)))
+        return cursor.lastrowid
+
+    def contributions(self, test):
+        """Feature contributions stored with test number ``test`` (a Series), None if it has none."""
+        where, params = _where([('Test', 'between', (int(test), int(test)))], self.owner)
+        with self._connection() as connection:
+            row = connection.execute(
+                f'SELECT {", ".join(CONTRIBUTION_SQL_COLUMNS.values())} FROM history_contributions '
+                f'WHERE id IN (SELECT id FROM history{where})', params).fetchone()
+        return None if row is None else pd.Series(row, index=CONTRIBUTION_COLUMNS, dtype='float64')
+
+    def summary(self):
+        """Aggregates over the whole history, read without scanning it."""
+        stats_where, stats_params = self._owned('owner_result_stats')
+        counts_where, counts_params = self._owned('owner_category_counts')
+        with self._connection() as connection:
+            row = connection.execute(f'SELECT SUM(count), MIN(min), MAX(max), SUM(sum), SUM(sum_sq) '
+                                     f'FROM owner_result_stats{stats_where}', stats_params).fetchone()
+            counts = connection.execute(f'SELECT feature, code, SUM(count) FROM owner_category_counts{counts_where} '
+                                        f'GROUP BY feature, code', counts_params).fetchall()
+        count, minimum, maximum, total, total_sq = row if row[0] else (0, None, None, 0.0, 0.0)
+        category_counts = {column: {} for column in CATEGORIES}
+        for column, code, category_count in counts:
+            if column in category_counts:
+                category_counts[column][CATEGORIES[column][code]] = category_count
+        return HistorySummary(count, minimum, maximum, total, total_sq, category_counts)
+
+    def _rebuild_aggregates(self, connection):
+        with connection:
+            connection.execute('DELETE FROM owner_result_stats')
+            connection.execute('DELETE FROM owner_category_counts')
+            connection.execute("""
+                INSERT INTO owner_result_stats (owner, count, min, max, sum, sum_sq)
+                SELECT owner, COUNT(*), MIN(result), MAX(result), SUM(result), SUM(result * result)
+                FROM history GROUP BY owner
+            """)
+            for column in CATEGORIES:
+                connection.execute(f"""
+                    INSERT INTO owner_category_counts (owner, feature, code, count)
+                    SELECT owner, ?, {COLUMNS[column]}, COUNT(*) FROM history GROUP BY owner, {COLUMNS[column]}
+                """, (column,))
+
+    @traced('history_count')
+    def count(self, filters=None):
+        where, params = _where(filters, self.owner)
+        with self._connection() as connection:
+            return connection.execute(f'SELECT COUNT(*) FROM history{where}', params).fetchone()[0]
+
+    def state(self):
+        """(number of tests, last test number) of the whole history, read without scanning it.
+
+        Tests are only ever appended, so the pair changes whenever the history does.
+        """
+        stats_where, stats_params = self._owned('owner_result_stats')
+        where, params = _where(None, self.owner)
+        with self._connection() as connection:
+            count, last_test = connection.execute(
+                f'SELECT (SELECT SUM(count) FROM owner_result_stats{stats_where}), (SELECT MAX(id) FROM history{where})',
+                stats_params + params).fetchone()
+        return count or 0, last_test or 0
+
+    def value_range(self, column, filters=None):
+        """(min, max) of a numeric history column or of ``'Test'``, ``(None, None)`` if nothing matches."""
+        where, params = _where(filters, self.owner)
+        sql_column = 'id' if column == 'Test' else COLUMNS[column]
+        with self._connection() as connection:
+            return connection.execute(f'SELECT MIN({sql_column}), MAX({sql_column}) FROM history{where}',
+                                      params).fetchone()
+
+    def distinct(self, column, filters=None):
+        """Distinct labels (or values) of a column that occur in the history."""
+        where, params = _where(filters, self.owner)
+        sql_column = COLUMNS[column]
+        with self._connection() as connection:
+            rows = connection.execute(f'SELECT DISTINCT {sql_column} FROM history{where} ORDER BY {sql_column}',
+                                      params).fetchall()
+        values = [row[0] for row in rows]
+        return [CATEGORIES[column][code] for code in values] if column in CATEGORIES else values
+
+    @traced('history_query')
+    def query(self, columns=None, filters=None, limit=None, offset=0, descending=False):
+        """History rows as a DataFrame indexed by test number.
+
+        ``columns`` selects history columns (all by default). ``filters`` is a
+        list of ``(column, operator, value)`` with operator ``'in'`` (value is a
+        list of labels/values) or ``'between'`` (value is ``(low, high)``,
+        inclusive). Besides the history columns, ``'Test'`` filters on the
+        test number. Categorical columns come back as pandas Categoricals,
+        Timestamp as a local time string and Result as a float percentage.
+        """
+        columns = list(COLUMNS) if columns is None else list(columns)
+        where, params = _where(filters, self.owner)
+        select = ', '.join(['id'] + [COLUMNS[column] for column in columns])
+        sql = f'SELECT {select} FROM history{where} ORDER BY id{" DESC" if descending else ""}'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [int(limit), int(offset)]
+
+        with self._connection() as connection:
+            frame = pd.read_sql_query(sql, connection, params=params, index_col='id')
+        frame.columns = columns
+        frame.index.name = 'Test'
+        for column in columns:
+            if column in CATEGORIES:
+                frame[column] = decode_codes(frame[column].to_numpy(), column)
+        if 'Timestamp' in columns:
+            frame['Timestamp'] = format_timestamps(frame['Timestamp'])
+        return frame
+
+    def iter_query(self, columns=None, filters=None, chunk_rows=10_000):
+        """Yield ``query()`` results in chunks of at most ``chunk_rows`` tests, in test order.
+
+        Each chunk is its own query that resumes after the last test number
+        seen (keyset pagination on the primary key), so memory stays bounded
+        by one chunk and late chunks cost no more than early ones.
+        """
+        filters = list(filters or [])
+        last_test = 0
+        while True:
+            chunk = self.query(columns, filters + [('Test', 'between', (last_test + 1, MAX_TEST))], limit=chunk_rows)
+            if len(chunk):
+                yield chunk
+            if len(chunk) < chunk_rows:
+                return
+            last_test = int(chunk.index[-1])
+
+
+def format_timestamps(epoch_seconds):
+    """Local time strings for a Series of epoch seconds."""
+    local = pd.to_datetime(epoch_seconds, unit='s', utc=True).dt.tz_convert(TIMEZONE)
+    return local.dt.strftime(TIMESTAMP_FORMAT)
+
+
+def _where(filters, owner=None):
+    clauses, params = ([], []) if owner is None else (['owner = ?'], [owner])
+    for column, operator, value in filters or []:
+        sql_column = 'id' if column == 'Test' else COLUMNS[column]
+        if operator == 'in':
+            values = [CODES[column][label] for label in value] if column in CODES else list(value)
+            if not values:
+                clauses.append('0')
+                continue
+            clauses.append(f'{sql_column} IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+        elif operator == 'between':
+            clauses.append(f'{sql_column} BETWEEN ? AND ?')
+            params.extend(value)
+        else:
+            raise ValueError(f"Unknown filter operator: {operator}")
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+                atexit.register(_store.close)
+    return _store
+
+
+def session_owner():
+    """Owner of the tests of the current viewer (see the module docstring)."""
+    owner = os.environ.get('CARDIALYZE_HISTORY_OWNER')
+    if owner:
+        return owner
+    import streamlit as st
+
+    if st.user.get('is_logged_in'):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    if 'history_owner' not in st.session_state:
+        st.session_state['history_owner'] = f'session:{secrets.token_hex(16)}'
+    return st.session_state['history_owner']
+
+
+def session_history():
+    """The history store restricted to the current viewer's tests."""
+    return get_history_store().for_owner(session_owner())
@@ -0,0 +1,261 @@
+"""Process-wide inference executor shared by every Streamlit session.
+
+Streamlit runs each session's script on its own thread. Without this module
+every session called ``predict_proba`` itself, and each call started
+XGBoost's OpenMP threads on all cores, so a busy clinic oversubscribed the
+CPU many times over and tail latency spiked. Sessions now submit their rows
+to one executor:
+
+* a fixed pool of ``workers`` threads scores the requests, on the
+  executor's own copy of each model version with XGBoost's ``nthread`` set
+  to ``threads_per_worker``. By default that is one thread per worker and
+  one worker per core. The registry's model keeps its default, so callers
+  outside the executor still use every core,
+* the queue holds at most ``max_queue`` requests. A submit waits up to
+  ``submit_timeout`` seconds for space, and a caller waits at most
+  ``timeout`` seconds for its result. Either limit raises ``InferenceBusy``,
+  which pages show as a friendly "busy" message instead of piling up more
+  work,
+* a worker that picks up a request also takes every queued request for the
+  same model version, up to ``max_batch_rows`` rows, and scores them with a
+  single ``predict_proba`` call. Requests that arrive together are
+  coalesced without waiting for stragglers. Contribution requests
+  (``predict_contributions``) are coalesced the same way, but separately,
+* a matrix of more than ``max_batch_rows`` rows (a chunk of an uploaded
+  file) is submitted one slice at a time, so interactive requests that
+  arrive meanwhile are scored between its slices instead of after all of
+  it.
+
+``bind(entry)`` returns a copy of a ``LoadedModel`` whose ``predictor``
+submits to the executor. It can be passed anywhere a loaded model is
+expected (prediction cache, what-if sweeps, bulk scoring).
+"""
+import copy
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import replace
+
+import numpy as np
+
+from cardialyze.contributions import predict_contributions
+from cardialyze.tracing import span
+
+WORKERS = int(os.environ.get("CARDIALYZE_INFERENCE_WORKERS", 0)) or os.cpu_count() or 1
+
+THREADS_PER_WORKER = int(os.environ.get("CARDIALYZE_INFERENCE_THREADS", 1))
+
+MAX_QUEUE = int(os.environ.get("CARDIALYZE_INFERENCE_QUEUE", 256))
+
+# Rows scored by one coalesced predict_proba call, and the slice size of larger matrices
+MAX_BATCH_ROWS = 4096
+
+# Seconds a submit waits for queue space, and a caller for its result, before InferenceBusy
+SUBMIT_TIMEOUT = 2.0
+RESULT_TIMEOUT = 10.0
+
+
+class InferenceBusy(RuntimeError):
+    """The executor could not take or finish a request in time."""
+
+    def __init__(self, message="The prediction service is busy, please try again in a moment."):
+        super().__init__(message)
+
+
+class _Request:
+    __slots__ = ('entry', 'X', 'explain', 'future')
+
+    def __init__(self, entry, X, explain):
+        self.entry = entry
+        self.X = X
+        # Feature contributions instead of predict_proba
+        self.explain = explain
+        self.future = Future()
+
+
+class _QueuedPredictor:
+    """``predict_proba`` that goes through the executor, for one loaded model."""
+
+    def __init__(self, executor, entry):
+        self._executor = executor
+        self._entry = entry
+
+    def predict_proba(self, X):
+        return self._executor.predict_proba(self._entry, X)
+
+    def predict_contributions(self, X):
+        return self._executor.predict_contributions(self._entry, X)
+
+
+class InferenceExecutor:
+    def __init__(self, workers=WORKERS, threads_per_worker=THREADS_PER_WORKER, max_queue=MAX_QUEUE,
+                 max_batch_rows=MAX_BATCH_ROWS, submit_timeout=SUBMIT_TIMEOUT, timeout=RESULT_TIMEOUT):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_queue = max_queue
+        self.max_batch_rows = max_batch_rows
+        self.submit_timeout = submit_timeout
+        self.timeout = timeout
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.batches = 0
+        self.requests_scored = 0
+        self.rows_scored = 0
+        self._queue = deque()
+        # Model version -> the executor's pinned copy of the loaded model
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._run, name=f'cardialyze-inference-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    @property
+    def mean_batch_requests(self):
+        return self.requests_scored / self.batches if self.batches else 0.0
+
+    def bind(self, entry):
+        """Copy of the loaded model ``entry`` whose predictor scores through this executor."""
+        return replace(entry, predictor=_QueuedPredictor(self, entry))
+
+    def submit(self, entry, X, explain=False):
+        """Queue the feature matrix ``X`` for ``entry`` and return a Future of its ``predict_proba`` result.
+
+        With ``explain`` the result is its contribution matrix (see cardialyze.contributions).
+        """
+        request = _Request(entry, np.asarray(X, dtype=np.float64), explain)
+        deadline = time.monotonic() + self.submit_timeout
+        with self._condition:
+            while len(self._queue) >= self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise InferenceBusy()
+                self._condition.wait(remaining)
+            self._queue.append(request)
+            self.submitted += 1
+            self._condition.notify_all()
+        return request.future
+
+    def predict_proba(self, entry, X, timeout=None):
+        """Submit and wait. Raises ``InferenceBusy`` if the request is not scored within ``timeout`` seconds.
+
+        ``X`` is split into slices of ``max_batch_rows`` rows, submitted one
+        after the other. The timeout applies to each slice.
+        """
+        return self._score(entry, X, False, timeout)
+
+    def predict_contributions(self, entry, X, timeout=None):
+        """Like ``predict_proba()``, for the contribution matrix of ``X``."""
+        return self._score(entry, X, True, timeout)
+
+    def _score(self, entry, X, explain, timeout):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) <= self.max_batch_rows:
+            return self._wait(self.submit(entry, X, explain), timeout)
+        # The next slice queues behind whatever was submitted while this one was scored
+        return np.concatenate([self._wait(self.submit(entry, X[start:start + self.max_batch_rows], explain), timeout)
+                               for start in range(0, len(X), self.max_batch_rows)])
+
+    def _wait(self, future, timeout):
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            # A request that is still queued is dropped, one already being scored just finishes unread
+            future.cancel()
+            with self._condition:
+                self.timed_out += 1
+            raise InferenceBusy() from None
+
+    def _take_batch(self):
+        """Oldest request plus every queued request of the same kind and model, up to ``max_batch_rows`` rows."""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            first = self._queue.popleft()
+            batch = [first]
+            rows = len(first.X)
+            version = first.entry.version
+            for request in list(self._queue):
+                if request.entry.version != version or request.explain != first.explain:
+                    continue
+                if rows + len(request.X) > self.max_batch_rows:
+                    break
+                self._queue.remove(request)
+                batch.append(request)
+                rows += len(request.X)
+            # Wake submitters waiting for queue space
+            self._condition.notify_all()
+        return [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+    def _pinned(self, entry):
+        """The executor's copy of ``entry``, with XGBoost pinned to this worker's share of the cores."""
+        with self._models_lock:
+            pinned = self._models.get(entry.version)
+            if pinned is not None:
+                return pinned
+            model = entry.model
+            if hasattr(model, 'get_booster'):
+                model = copy.deepcopy(model)
+                # Older pickles miss parameters that set_params() validates, so set the attribute directly
+                model.n_jobs = self.threads_per_worker
+                model.get_booster().set_param({'nthread': self.threads_per_worker})
+            # The compiled ensemble runs on the calling thread and is shared as is
+            predictor = model if entry.predictor is entry.model else entry.predictor
+            pinned = replace(entry, model=model, predictor=predictor)
+            # Keep the previous version for requests still queued for it
+            self._models = {version: kept for version, kept in list(self._models.items())[-1:]}
+            self._models[entry.version] = pinned
+            return pinned
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                entry = self._pinned(batch[0].entry)
+                with span('inference_batch'):
+                    X = batch[0].X if len(batch) == 1 else np.concatenate([request.X for request in batch])
+                    if batch[0].explain:
+                        results = predict_contributions(entry, X, nthread=self.threads_per_worker)
+                    else:
+                        results = entry.predictor.predict_proba(X)
+            except Exception as exc:
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(results[offset:offset + len(request.X)])
+                offset += len(request.X)
+            with self._condition:
+                self.batches += 1
+                self.requests_scored += len(batch)
+                self.rows_scored += offset
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = InferenceExecutor()
+    return _executor
+
+
+def current_inference_executor():
+    """The shared executor if a prediction has started it, else None (without starting its workers)."""
+    return _executor
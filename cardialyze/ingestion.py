@@ -0,0 +1,95 @@
+"""Vectorized ingestion of the UCI heart-disease files into the ``OHCA.csv`` layout.
+
+``OHCA.csv`` was built in two notebooks. ``blending_data.ipynb`` concatenated
+the four ``processed.*.data`` files (Cleveland, Hungarian, Switzerland, VA).
+``prepare_data.ipynb`` then cleaned the blend with row-wise ``apply`` calls.
+This module does the same in column-wise passes::
+
+    python -m cardialyze.ingestion processed.*.data --output ohca.parquet
+
+* every source file is parsed with the same explicit dtypes and ``?`` as
+  missing, then concatenated once. Headerless ``processed.*.data`` files and
+  files with the ``OHCA.csv`` header can be mixed,
+* ``output`` is binarized (any diagnosis above 0 is presence) and ``ca`` and
+  ``thal`` are dropped, as in the notebooks,
+* missing categorical values take the column mode and missing numeric
+  values the column mean. Integer columns are then truncated to ``int64``,
+  which matches the notebook's ``int(float(x))``,
+* exact duplicate rows are removed.
+
+The result is written as Parquet with the ``OHCA.csv`` columns, minus ``ca``
+and ``thal``.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cardialyze.features import SOURCE_COLUMNS
+
+# Columns of the processed.*.data files, in file order
+RAW_COLUMNS = list(SOURCE_COLUMNS) + ['ca', 'thal', 'output']
+
+# Every column is read as float64: '?' can appear anywhere, and NaN needs a float column
+RAW_DTYPES = {col: np.float64 for col in RAW_COLUMNS}
+
+DROP_COLUMNS = ['ca', 'thal']
+
+# Missing values are imputed with the mode (categorical) or the mean (numeric) of their column
+MODE_COLUMNS = ['fbs', 'restecg', 'exang', 'slope']
+MEAN_COLUMNS = ['trestbps', 'chol', 'thalach', 'oldpeak']
+
+# Stored as whole numbers once imputed; oldpeak stays a float
+INT_COLUMNS = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 'thalach', 'exang', 'slope', 'output']
+
+
+def _has_header(path):
+    with open(path) as f:
+        return f.readline().lstrip().startswith(RAW_COLUMNS[0])
+
+
+def read_sources(paths):
+    """Concatenation of the UCI-layout files in ``paths``, all columns float64 with NaN for ``?``."""
+    frames = []
+    for path in paths:
+        header = _has_header(path)
+        frames.append(pd.read_csv(path, header=0 if header else None, names=RAW_COLUMNS, na_values='?',
+                                  dtype=RAW_DTYPES, engine='pyarrow'))
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def clean(df):
+    """Binarize, impute, cast and deduplicate a frame from ``read_sources`` (the prepare_data.ipynb steps)."""
+    df = df.drop(columns=DROP_COLUMNS, errors='ignore')
+    df['output'] = df['output'] > 0
+    for col in MODE_COLUMNS:
+        df[col] = df[col].fillna(df[col].mode().iloc[0])
+    for col in MEAN_COLUMNS:
+        df[col] = df[col].fillna(df[col].mean())
+
+    # Rows still missing a value (age, sex or cp, never missing in the UCI files) cannot be imputed
+    df = df.dropna()
+    df = df.astype({col: np.int64 for col in INT_COLUMNS})
+    return df.drop_duplicates(ignore_index=True)
+
+
+def ingest(paths, dest=None):
+    """Read, clean and (if ``dest`` is given) write the blend as Parquet. Returns the cleaned frame."""
+    df = clean(read_sources(paths))
+    if dest is not None:
+        df.to_parquet(dest, index=False)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Blend and clean the UCI heart-disease files into Parquet.")
+    parser.add_argument('sources', nargs='+', type=Path, help="processed.*.data files or OHCA.csv-layout CSVs")
+    parser.add_argument('--output', required=True, type=Path)
+    args = parser.parse_args(argv)
+    df = ingest(args.sources, args.output)
+    print(f"Wrote {len(df):,} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Reduced-payload Dashboard charts for large histories.
+
+Above ``LARGE_HISTORY_THRESHOLD`` tests, sending every test to the browser
+as SVG points freezes the page. The builders here produce the same charts
+from a bounded amount of data instead:
+
+* the test history line is downsampled with LTTB and drawn with Scattergl,
+* scatter points are collapsed to unique (x, y, colour) combinations drawn
+  with Scattergl, with the marker size showing the number of tests,
+* histograms are pre-binned and box/violin inputs reduced to quantiles,
+* the Age -> Gender -> Chest Pain hierarchy uses 5-year age bands and counts.
+
+The size of every figure depends on the value ranges of the inputs, not on
+the number of tests.
+"""
+import numpy as np
+import pandas as pd
+
+from cardialyze.startup import lazy_import
+
+# plotly is only imported once a chart is actually built
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+
+LARGE_HISTORY_THRESHOLD = 5000
+
+# Points kept by the downsampled history line
+HISTORY_POINTS = 2000
+
+HISTOGRAM_BINS = 30
+
+AGE_BAND_YEARS = 5
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    ``x`` must be sorted. The first and last points are always kept, and one
+    point is chosen from each of ``threshold - 2`` equal-width buckets.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket i covers points edges[i]:edges[i + 1]
+    edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)) + 1).astype(np.int64)
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # Twice the triangle area between the previous kept point, each candidate and the next bucket's mean
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
+
+
+def history_line(df):
+    timestamps = pd.to_datetime(df['Timestamp'])
+    order = np.argsort(timestamps.to_numpy(), kind='stable')
+    x = timestamps.to_numpy()[order]
+    y = df['Result'].to_numpy()[order]
+    kept = lttb(x.astype('datetime64[s]').astype(np.int64), y, HISTORY_POINTS)
+
+    fig = go.Figure(go.Scattergl(x=x[kept], y=y[kept], mode='lines+markers', name='Result',
+                                 marker=dict(size=4, color=px.colors.qualitative.Plotly[0]), line=dict(width=1)))
+    fig.update_layout(title=f'Cardiac Arrest Test History ({len(kept):,} of {len(df):,} tests shown)',
+                      xaxis_title='Timestamp', yaxis_title='Result')
+    return fig
+
+
+def age_result_bar(df):
+    mean_result = df.groupby('Age', observed=True)['Result'].mean().reset_index()
+    fig = px.bar(mean_result, x='Age', y='Result', title='Age vs Cardiac Arrest Risk (mean per age)',
+                 color='Result', color_continuous_scale=px.colors.sequential.Viridis)
+    return fig
+
+
+def histogram(df, column, title, color):
+    counts, edges = np.histogram(df[column].to_numpy(dtype=np.float64), bins=HISTOGRAM_BINS)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                           marker_color=color, name=column))
+    fig.update_layout(title=title, xaxis_title=column, yaxis_title='count', bargap=0)
+    return fig
+
+
+def box_stats(values):
+    """Quartiles and Tukey whiskers (1.5 IQR, clipped to the data) of a numeric array."""
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return dict(q1=[q1], median=[median], q3=[q3], lowerfence=[inside.min()], upperfence=[inside.max()])
+
+
+def quantile_box(df, y, title, color, x=None, group=None, colors=None):
+    """Box plot drawn from precomputed quantiles, optionally split by ``x`` and coloured by ``group``."""
+    fig = go.Figure()
+    groups = df.groupby(group, observed=True) if group else [(y, df)]
+    for g, (name, group_df) in enumerate(groups):
+        stats = {key: [] for key in ('q1', 'median', 'q3', 'lowerfence', 'upperfence')}
+        categories = []
+        for category, category_df in (group_df.groupby(x, observed=True) if x else [(None, group_df)]):
+            for key, value in box_stats(category_df[y].to_numpy(dtype=np.float64)).items():
+                stats[key].extend(value)
+            categories.append(category)
+        fig.add_trace(go.Box(x=categories if x else None, name=str(name), **stats,
+                             marker_color=(colors or [color])[g % len(colors or [color])]))
+    fig.update_layout(title=title, yaxis_title=y, xaxis_title=x, boxmode='group' if group else None)
+    return fig
+
+
+def counted_scatter(df, x, y, color, title, colors):
+    """Scattergl of unique (x, y, colour) combinations, marker area growing with the number of tests."""
+    counts = df.groupby([x, y, color], observed=True).size().reset_index(name='Tests')
+    fig = go.Figure()
+    for g, (name, group_df) in enumerate(counts.groupby(color, observed=True)):
+        fig.add_trace(go.Scattergl(
+            x=group_df[x], y=group_df[y], mode='markers', name=str(name),
+            marker=dict(size=4 + 2 * np.sqrt(group_df['Tests']), color=colors[g % len(colors)], opacity=0.7),
+            customdata=group_df['Tests'], hovertemplate=f'{x}: %{{x}}<br>{y}: %{{y}}<br>Tests: %{{customdata}}',
+        ))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, legend_title_text=color)
+    return fig
+
+
+def age_hierarchy_counts(df):
+    """Counts per (age band, gender, chest pain type) for the sunburst and treemap."""
+    low = (df['Age'] // AGE_BAND_YEARS) * AGE_BAND_YEARS
+    bands = low.astype(int).astype(str) + '-' + (low + AGE_BAND_YEARS - 1).astype(int).astype(str)
+    grouped = pd.DataFrame({'Age': bands, 'Gender': df['Gender'], 'Chest Pain Type': df['Chest Pain Type']})
+    return grouped.groupby(['Age', 'Gender', 'Chest Pain Type'], observed=True).size().reset_index(name='Count')
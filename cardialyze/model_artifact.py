@@ -0,0 +1,162 @@
+"""Native XGBoost model artifacts with a sidecar manifest.
+
+The app has always shipped the model as a joblib pickle of the scikit-learn
+wrapper. Unpickling is slow, only works with the exact xgboost/scikit-learn
+versions that wrote it, and can run arbitrary code. The native format is
+XGBoost's own UBJSON booster dump (``.ubj``, or ``.json``), which every
+xgboost release can read. It travels with a manifest
+(``<artifact>.manifest.json``) that records:
+
+* the SHA-256 of the artifact, checked on every load,
+* the feature names and category encodings the model expects, checked
+  against ``cardialyze.features`` so a model trained on another encoding is
+  refused,
+* the xgboost version, conversion time and any training metadata,
+* what the model was made from: the pickle it was converted from
+  (``source.kind == 'pickle'``) or the dataset it was trained on
+  (``'dataset'``). A trained artifact also records the pickle it replaced
+  (``training.replaces_pickle``).
+
+Artifacts are hashed straight from a read-only memory map of the file.
+XGBoost then parses the same mapped bytes into its trees.
+
+Convert the shipped pickle with::
+
+    python -m cardialyze.model_artifact xgb_model_latest.pkl
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import time
+from pathlib import Path
+
+from cardialyze.features import CATEGORIES, FEATURE_COLUMNS
+
+NATIVE_SUFFIXES = ('.ubj', '.json')
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+# Version of the manifest layout
+MANIFEST_FORMAT = 1
+
+
+def manifest_path(path):
+    path = Path(path)
+    return path.with_name(path.name + MANIFEST_SUFFIX)
+
+
+def is_native(path):
+    return Path(path).suffix.lower() in NATIVE_SUFFIXES
+
+
+def read_manifest(path):
+    return json.loads(manifest_path(path).read_text())
+
+
+def check_manifest(manifest, checksum):
+    """Raise ``ValueError`` unless the manifest describes these bytes and the app's encoding."""
+    if manifest.get('sha256') != checksum:
+        raise ValueError("model artifact does not match the checksum in its manifest")
+    if manifest.get('feature_names') != FEATURE_COLUMNS:
+        raise ValueError(f"model expects features {manifest.get('feature_names')}, the app encodes {FEATURE_COLUMNS}")
+    if manifest.get('categories') != CATEGORIES:
+        raise ValueError("model was trained on different category encodings than cardialyze.features")
+
+
+def supersedes_pickle(manifest, pickle_sha256):
+    """Whether a native artifact stands in for the pickle with this SHA-256.
+
+    That is the pickle it was converted from, or for a trained artifact the
+    pickle that was in place when it was trained. Manifests from before
+    ``source.kind`` existed name a pickle source by its ``.pkl`` path.
+    """
+    source = manifest.get('source') or {}
+    kind = source.get('kind') or ('pickle' if str(source.get('path', '')).endswith('.pkl') else 'dataset')
+    if kind == 'pickle':
+        return source.get('sha256') == pickle_sha256
+    replaced = (manifest.get('training') or {}).get('replaces_pickle') or {}
+    return replaced.get('sha256') == pickle_sha256
+
+
+def load_native(path):
+    """Load a native artifact through a memory map. Returns ``(model, sha256, stat, manifest)``."""
+    import xgboost as xgb
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        stat = os.fstat(f.fileno())
+        checksum = hashlib.sha256(buffer).hexdigest()
+        manifest = read_manifest(path)
+        check_manifest(manifest, checksum)
+        model = xgb.XGBClassifier()
+        # XGBoost only accepts a bytearray, filled straight from the mapped pages
+        model.load_model(bytearray(buffer))
+    return model, checksum, stat, manifest
+
+
+def load_model_file(path):
+    """Model from a pickle or a native artifact, picked by the file suffix."""
+    if is_native(path):
+        return load_native(path)[0]
+    import joblib
+    return joblib.load(path)
+
+
+def write_native(model, dest, training=None, source=None):
+    """Write ``model`` (an XGBClassifier) as a native artifact plus manifest. Returns the manifest."""
+    import xgboost as xgb
+
+    dest = Path(dest)
+    raw = model.get_booster().save_raw('json' if dest.suffix.lower() == '.json' else 'ubj')
+    config = json.loads(model.get_booster().save_config())
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'artifact': dest.name,
+        'sha256': hashlib.sha256(raw).hexdigest(),
+        'size': len(raw),
+        'feature_names': FEATURE_COLUMNS,
+        'categories': CATEGORIES,
+        'objective': config['learner']['objective']['name'],
+        'num_trees': model.get_booster().num_boosted_rounds(),
+        'xgboost_version': xgb.__version__,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'source': source,
+        'training': training or {},
+    }
+    # Artifact first, manifest last: a reader that sees the new manifest also sees the new model
+    _write_atomic(dest, bytes(raw))
+    _write_atomic(manifest_path(dest), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def _write_atomic(path, data):
+    scratch = path.with_name(f'.{path.name}.tmp')
+    scratch.write_bytes(data)
+    os.replace(scratch, path)
+
+
+def convert(source, dest=None):
+    """Convert a joblib pickle into a native artifact next to it (same name, ``.ubj``)."""
+    import joblib
+
+    source = Path(source)
+    dest = Path(dest) if dest else source.with_suffix('.ubj')
+    payload = source.read_bytes()
+    model = joblib.load(source)
+    write_native(model, dest, source={'kind': 'pickle', 'path': source.name,
+                                      'sha256': hashlib.sha256(payload).hexdigest()})
+    return dest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a pickled model into a native XGBoost artifact.")
+    parser.add_argument('source', type=Path, help="joblib pickle of the XGBClassifier")
+    parser.add_argument('dest', nargs='?', type=Path, help="output artifact (.ubj or .json, default: SOURCE.ubj)")
+    args = parser.parse_args(argv)
+    dest = convert(args.source, args.dest)
+    print(f"Wrote {dest} and {manifest_path(dest)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""Process-wide registry for the trained XGBoost model.
+
+Streamlit re-executes every page script on each widget interaction, but
+imported modules stay resident for the lifetime of the server process. The
+registry lives here so the pickle is deserialized once and shared by all
+sessions, and is only reloaded when the artifact on disk actually changes.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+
+from cardialyze.compiled_model import CompiledEnsemble
+from cardialyze.model_artifact import is_native, load_native, read_manifest, supersedes_pickle
+from cardialyze.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+PICKLE_PATH = Path(__file__).resolve().parent.parent / "xgb_model_latest.pkl"
+
+NATIVE_PATH = PICKLE_PATH.with_suffix('.ubj')
+
+# (mtime_ns, size) of the pickle -> its SHA-256, so a replaced pickle is only hashed once
+_pickle_hashes: Dict[tuple, str] = {}
+_warned_pickles = set()
+
+
+def default_model_path() -> Path:
+    """The artifact to serve when none is given.
+
+    ``CARDIALYZE_MODEL_PATH`` picks it explicitly. Otherwise the native
+    artifact (see cardialyze.model_artifact) is preferred, unless the pickle
+    is newer and the artifact does not stand in for it: it was neither
+    converted from that pickle nor trained while that pickle was in place
+    (``supersedes_pickle()``). That is the case when a retrained pickle is
+    dropped in place, so the pickle is used (with a warning) until it is
+    converted.
+    """
+    explicit = os.environ.get("CARDIALYZE_MODEL_PATH")
+    if explicit:
+        return Path(explicit)
+    try:
+        native_stat = os.stat(NATIVE_PATH)
+    except OSError:
+        return PICKLE_PATH
+    try:
+        pickle_stat = os.stat(PICKLE_PATH)
+    except OSError:
+        return NATIVE_PATH
+    if pickle_stat.st_mtime_ns <= native_stat.st_mtime_ns:
+        return NATIVE_PATH
+
+    key = (pickle_stat.st_mtime_ns, pickle_stat.st_size)
+    if key not in _pickle_hashes:
+        _pickle_hashes.clear()
+        _pickle_hashes[key] = hashlib.sha256(PICKLE_PATH.read_bytes()).hexdigest()
+    try:
+        manifest = read_manifest(NATIVE_PATH)
+    except (OSError, ValueError):
+        manifest = {}
+    if supersedes_pickle(manifest, _pickle_hashes[key]):
+        return NATIVE_PATH
+    if key not in _warned_pickles:
+        _warned_pickles.add(key)
+        logger.warning("%s is newer than %s and was not converted from it or replaced by it, serving the pickle. "
+                       "Convert it with python -m cardialyze.model_artifact %s",
+                       PICKLE_PATH.name, NATIVE_PATH.name, PICKLE_PATH.name)
+    return PICKLE_PATH
+
+
+# The artifact command-line tools load. The registry re-resolves it on every check, see default_model_path()
+MODEL_PATH = default_model_path()
+
+# "xgboost" scores with the unpickled XGBClassifier, "compiled" with the array-compiled
+# ensemble from cardialyze.compiled_model (falls back to xgboost if it cannot be used)
+PREDICTOR = os.environ.get("CARDIALYZE_PREDICTOR", "xgboost")
+
+# Largest probability difference tolerated between the compiled ensemble and XGBoost
+COMPILED_TOLERANCE = 1e-5
+
+# Default patient from the Prognose page, encoded the same way as calculate_prediction()
+WARMUP_ROW = np.array([[28, 1, 0, 92, 85, 0, 0, 80, 0, 0.0, 0]])
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    model: Any
+    # Object used for scoring: the model itself or its compiled ensemble, both offer predict_proba()
+    predictor: Any
+    path: Path
+    checksum: str
+    mtime_ns: int
+    size: int
+    loaded_at: float
+    load_seconds: float
+    warmup_seconds: float
+    # Sidecar manifest of a native artifact (None for pickles)
+    manifest: Optional[Dict[str, Any]] = None
+
+    @property
+    def version(self) -> str:
+        # Short content hash, stable across copies of the same artifact
+        return self.checksum[:12]
+
+
+class ModelRegistry:
+    """Loads a model artifact once and hot-reloads it when the file changes.
+
+    ``get()`` is cheap: the file is only stat'ed every ``check_interval``
+    seconds, and only re-hashed when its mtime or size moved. A reload is
+    fully prepared (read, hash, unpickle, warm-up) before it replaces the
+    current entry, so concurrent sessions never observe a half-loaded model.
+    Without an explicit ``path`` the artifact is picked again with
+    ``default_model_path()`` on every check.
+    """
+
+    def __init__(self, path=None, check_interval: float = 2.0, predictor: str = PREDICTOR):
+        self._follow_default = path is None
+        self.path = default_model_path() if path is None else Path(path)
+        self.check_interval = check_interval
+        self.predictor = predictor
+        self.last_error: Optional[BaseException] = None
+        self._entry: Optional[LoadedModel] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> LoadedModel:
+        entry = self._entry
+        if entry is not None and time.monotonic() - self._last_check < self.check_interval:
+            return entry
+
+        with self._lock:
+            entry = self._entry
+            self._last_check = time.monotonic()
+            if self._follow_default:
+                self.path = default_model_path()
+            try:
+                stat = os.stat(self.path)
+            except OSError as exc:
+                if entry is None:
+                    raise
+                self.last_error = exc
+                logger.warning("Model artifact %s is unavailable, keeping version %s", self.path, entry.version)
+                return entry
+
+            if entry is not None and (stat.st_mtime_ns, stat.st_size) == (entry.mtime_ns, entry.size):
+                return entry
+
+            try:
+                self._entry = self._load(entry)
+                self.last_error = None
+            except Exception as exc:
+                # A file that is half-written or corrupt must not take down sessions
+                # that are happily using the previous version
+                if entry is None:
+                    raise
+                self.last_error = exc
+                logger.exception("Reloading %s failed, keeping version %s", self.path, entry.version)
+            return self._entry
+
+    def reload(self) -> LoadedModel:
+        """Force the next ``get()`` to re-check the artifact on disk."""
+        with self._lock:
+            self._last_check = 0.0
+            if self._entry is not None:
+                self._entry = replace(self._entry, mtime_ns=-1)
+        return self.get()
+
+    @property
+    def current(self) -> Optional[LoadedModel]:
+        return self._entry
+
+    @traced('model_load')
+    def _load(self, previous: Optional[LoadedModel]) -> LoadedModel:
+        started = time.perf_counter()
+        if is_native(self.path):
+            # Hashed, checked against its manifest and parsed from one memory map
+            model, checksum, stat, manifest = load_native(self.path)
+        else:
+            # Hash and unpickle the very same bytes, so the checksum always describes the loaded model
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                payload = f.read()
+            checksum = hashlib.sha256(payload).hexdigest()
+            model, manifest = None, None
+
+        if previous is not None and checksum == previous.checksum:
+            # Touched but not modified
+            return replace(previous, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+        if model is None:
+            model = joblib.load(io.BytesIO(payload))
+        predictor = self._compile(model) if self.predictor == "compiled" else model
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        predictor.predict_proba(WARMUP_ROW)
+        warmup_seconds = time.perf_counter() - started
+
+        entry = LoadedModel(
+            model=model,
+            predictor=predictor,
+            path=self.path,
+            checksum=checksum,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            loaded_at=time.time(),
+            load_seconds=load_seconds,
+            warmup_seconds=warmup_seconds,
+            manifest=manifest,
+        )
+        logger.info("Loaded model %s from %s in %.1f ms (warm-up %.1f ms)",
+                    entry.version, self.path, load_seconds * 1000, warmup_seconds * 1000)
+        return entry
+
+    def _compile(self, model):
+        try:
+            compiled = CompiledEnsemble.from_model(model)
+            difference = np.abs(compiled.predict_proba(WARMUP_ROW) - model.predict_proba(WARMUP_ROW)).max()
+            if difference > COMPILED_TOLERANCE:
+                raise ValueError(f"compiled ensemble differs from XGBoost by {difference:.2e}")
+        except ValueError as exc:
+            logger.warning("Cannot use the compiled ensemble for %s (%s), using XGBoost", self.path, exc)
+            return model
+        return compiled
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
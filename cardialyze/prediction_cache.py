@@ -0,0 +1,161 @@
+"""Process-wide cache of predicted probabilities.
+
+Nurses re-submit the same patient and the form defaults are scored over and
+over, so probabilities are cached per encoded feature row and shared by all
+sessions. Entries are keyed by the model version as well, and the whole
+cache is dropped as soon as a different model version is seen, so a
+reloaded artifact (see cardialyze.model_registry) never serves old results.
+
+Explained predictions (``explain()``) also cache the row's feature
+contributions (see cardialyze.contributions). A row that was only scored
+before is scored again, with contributions, the first time it is explained.
+
+Entries are evicted least recently used first beyond ``max_entries`` and
+expire ``ttl`` seconds after they were scored. Only interactive predictions
+add entries. Bulk scoring (cardialyze.batch) reads the cache with
+``get_many()``, which neither inserts nor reorders anything, and scores only
+the rows it misses, so an uploaded file cannot evict the cached patients.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cardialyze.contributions import predict_contributions, probabilities
+
+MAX_ENTRIES = 50_000
+
+TTL_SECONDS = 3600.0
+
+
+class PredictionCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def predict(self, entry, X):
+        """P(cardiac arrest) for every row of the feature matrix ``X`` with the loaded model ``entry``.
+
+        Rows are deduplicated first, and only distinct rows missing from the
+        cache are passed to ``entry.predictor.predict_proba`` (in one call).
+        """
+        return self._score(entry, X, explain=False)[0]
+
+    def explain(self, entry, X):
+        """Probabilities and contribution matrix (``CONTRIBUTION_COLUMNS``) for every row of ``X``.
+
+        Like ``predict()``, but missing rows are scored with one
+        ``predict_contributions`` call, which also yields their probabilities.
+        """
+        return self._score(entry, X, explain=True)
+
+    def get_many(self, entry, X, explain=False):
+        """Cached results for the rows of ``X``, without scoring or storing anything.
+
+        Returns ``(scores, contributions, missing)``: the probabilities (NaN
+        where missing), the contribution matrix with ``explain`` (else None)
+        and a boolean mask of the rows that still have to be scored. All rows
+        are looked up under one lock acquisition. The lookup is read-only:
+        entries, their LRU order and the hit counters are left untouched.
+        """
+        X, keys, _, inverse = _row_keys(X)
+        scores = np.full(len(keys), np.nan)
+        contributions = np.full((len(keys), X.shape[1] + 1), np.nan) if explain else None
+        found = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            if entry.version == self._version:
+                for i, key in enumerate(keys):
+                    cached = self._entries.get(key)
+                    if cached is not None and cached[2] > now and (not explain or cached[1] is not None):
+                        found[i] = True
+                        scores[i] = cached[0]
+                        if explain:
+                            contributions[i] = cached[1]
+        return scores[inverse], (contributions[inverse] if explain else None), ~found[inverse]
+
+    def _score(self, entry, X, explain):
+        X, keys, first_index, inverse = _row_keys(X)
+
+        scores = np.empty(len(keys), dtype=np.float64)
+        contributions = np.empty((len(keys), X.shape[1] + 1), dtype=np.float64) if explain else None
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            if entry.version != self._version:
+                self._entries.clear()
+                self._version = entry.version
+            for i, key in enumerate(keys):
+                cached = self._entries.get(key)
+                # Entries are (probability, contributions or None, expiry)
+                if cached is not None and cached[2] > now and (not explain or cached[1] is not None):
+                    self._entries.move_to_end(key)
+                    scores[i] = cached[0]
+                    if explain:
+                        contributions[i] = cached[1]
+                else:
+                    missing.append(i)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Score outside the lock, sessions racing on the same rows just score them twice
+            if explain:
+                explained = np.asarray(predict_contributions(entry, X[first_index[missing]]), dtype=np.float64)
+                scored = probabilities(explained)
+                contributions[missing] = explained
+            else:
+                explained = [None] * len(missing)
+                scored = entry.predictor.predict_proba(X[first_index[missing]])[:, 1]
+            scores[missing] = scored
+            expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                if entry.version == self._version:
+                    for i, probability, row in zip(missing, scored, explained):
+                        self._entries[keys[i]] = (float(probability), row, expires_at)
+                        self._entries.move_to_end(keys[i])
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return scores[inverse], (contributions[inverse] if explain else None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _row_keys(X):
+    """(X as contiguous floats, distinct row keys, first row of each key, key index of every row)."""
+    # Adding 0.0 turns -0.0 into 0.0, so equal rows always have equal bytes
+    X = np.ascontiguousarray(X, dtype=np.float64) + 0.0
+    rows = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+    unique_rows, first_index, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return X, [row.tobytes() for row in unique_rows], first_index, inverse.ravel()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
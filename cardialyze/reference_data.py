@@ -0,0 +1,201 @@
+"""Precomputed, columnar copy of the reference dataset behind the Dataset page.
+
+Preparing ``OHCA.csv`` for display (relabelling the categorical columns,
+decoding ``output``, factorizing everything for the correlation matrix) used
+to run on every rerun of the Dataset page. It now runs once per version of
+the CSV and its results are written next to each other under
+``REFERENCE_CACHE_DIR/<hash of the CSV>-v<ARTIFACT_VERSION>/``:
+
+* ``raw.parquet``: the CSV as read,
+* ``labelled.parquet``: readable labels as categorical dtypes (see
+  ``cardialyze.features.label_source_frame``), ``output`` decoded,
+* ``factorized.npy``: the numeric matrix the correlations are computed from,
+* ``correlation-<method>.parquet``: its Pearson and Spearman correlation
+  matrices, and the point-biserial correlation of each column with the
+  binary ``output``,
+* ``manifest.json``: written last, marks the directory as complete.
+
+A changed CSV gets a new hash and therefore a new directory, so stale
+artifacts are never read. Run ``python -m cardialyze.reference_data`` to
+prepare them ahead of deployment, otherwise the first page load does it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from cardialyze.count_cube import CountCube
+from cardialyze.features import decode_output, label_source_frame
+from cardialyze.tracing import traced
+
+DATASET_PATH = Path(__file__).resolve().parent.parent / "OHCA.csv"
+
+REFERENCE_CACHE_DIR = Path(os.environ.get("CARDIALYZE_REFERENCE_CACHE",
+                                          Path(__file__).resolve().parent.parent / ".reference_cache"))
+
+# Bumped whenever the set or format of the artifacts changes, so older directories are ignored
+ARTIFACT_VERSION = 2
+
+# Columns left out of the correlation matrix (both duplicate other columns: sex and the target)
+CORRELATION_EXCLUDE = ['Gender', 'output']
+
+CORRELATION_METHODS = ['Pearson', 'Spearman', 'Point-biserial']
+
+
+@dataclass(frozen=True)
+class ReferenceDataset:
+    """Prepared artifacts of one version of the reference CSV.
+
+    The frames are shared by every session and must be treated as read-only.
+    """
+    checksum: str
+    raw: pd.DataFrame
+    labelled: pd.DataFrame
+    factorized: np.ndarray
+    # Keyed by CORRELATION_METHODS; point-biserial is a single column against cardiac presence
+    correlations: Dict[str, pd.DataFrame]
+    # Categorical attributes counted against Gender and output, for the Sankey explorer
+    cube: CountCube
+
+    @property
+    def version(self) -> str:
+        return self.checksum[:12]
+
+    @property
+    def correlation(self) -> pd.DataFrame:
+        return self.correlations['Pearson']
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _standardize(matrix):
+    centered = matrix - matrix.mean(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Constant columns become NaN, which is what DataFrame.corr() reports for them
+        return centered / np.sqrt((centered ** 2).sum(axis=0))
+
+
+def correlation_matrices(factorized, target):
+    """Pearson, Spearman and point-biserial correlations of the ``factorized`` columns.
+
+    ``target`` is the binary outcome. The target is appended to the matrix and
+    all columns are standardized once, so one matrix product gives both the
+    Pearson matrix and the point-biserial column (a Pearson correlation with a
+    0/1 variable). Spearman is the same product over column ranks.
+    """
+    columns = list(factorized.columns)
+    values = np.column_stack([factorized.to_numpy(dtype=np.float64), np.asarray(target, dtype=np.float64)])
+    ranks = _standardize(pd.DataFrame(values[:, :-1]).rank(method='average').to_numpy())
+
+    standardized = _standardize(values)
+    pearson = standardized.T @ standardized
+    spearman = ranks.T @ ranks
+    return {
+        'Pearson': pd.DataFrame(pearson[:-1, :-1], index=columns, columns=columns),
+        'Spearman': pd.DataFrame(spearman, index=columns, columns=columns),
+        'Point-biserial': pd.DataFrame({'Cardiac Presence': pearson[:-1, -1]}, index=columns),
+    }
+
+
+def prepare(path=DATASET_PATH, cache_dir=REFERENCE_CACHE_DIR, checksum=None):
+    """Write the artifacts for ``path`` unless they already exist and return their directory."""
+    checksum = checksum or file_checksum(path)
+    target = Path(cache_dir) / f'{checksum[:16]}-v{ARTIFACT_VERSION}'
+    if (target / 'manifest.json').exists():
+        return target
+
+    raw = pd.read_csv(path)
+    labelled = label_source_frame(raw)
+    labelled['output'] = decode_output(labelled['output'])
+
+    # Factorize the categorical columns the same way the page always has (codes in order of appearance)
+    factorized = labelled.drop(columns=CORRELATION_EXCLUDE)
+    for col in factorized.select_dtypes(include=['object', 'category']).columns:
+        factorized[col] = pd.factorize(factorized[col])[0]
+    matrix = factorized.to_numpy(dtype=np.float64)
+    correlations = correlation_matrices(factorized, labelled['output'].cat.codes)
+
+    # Write into a scratch directory and move it into place, so readers never see a partial set
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(dir=cache_dir, prefix='.prepare-'))
+    try:
+        raw.to_parquet(scratch / 'raw.parquet', index=False)
+        labelled.to_parquet(scratch / 'labelled.parquet', index=False)
+        np.save(scratch / 'factorized.npy', matrix)
+        for method, correlation in correlations.items():
+            correlation.to_parquet(scratch / f'correlation-{method.lower()}.parquet')
+        manifest = {'source': str(path), 'checksum': checksum, 'rows': len(raw),
+                    'factorized_columns': list(factorized.columns)}
+        (scratch / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+        try:
+            scratch.rename(target)
+        except OSError:
+            # Another process finished the same version first
+            if not (target / 'manifest.json').exists():
+                raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return target
+
+
+@traced('reference_dataset_load')
+def load(path=DATASET_PATH, cache_dir=REFERENCE_CACHE_DIR):
+    """Load the prepared artifacts for ``path``, preparing them first if needed."""
+    checksum = file_checksum(path)
+    target = prepare(path, cache_dir, checksum)
+    labelled = pd.read_parquet(target / 'labelled.parquet', memory_map=True)
+    return ReferenceDataset(
+        checksum=checksum,
+        raw=pd.read_parquet(target / 'raw.parquet', memory_map=True),
+        labelled=labelled,
+        factorized=np.load(target / 'factorized.npy', mmap_mode='r'),
+        correlations={method: pd.read_parquet(target / f'correlation-{method.lower()}.parquet')
+                      for method in CORRELATION_METHODS},
+        cube=CountCube.from_frame(labelled),
+    )
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def get_reference_dataset(path=DATASET_PATH):
+    """Process-wide ReferenceDataset for ``path``, reloaded only when the file's mtime or size change."""
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    dataset = _datasets.get(key)
+    if dataset is None:
+        with _datasets_lock:
+            dataset = _datasets.get(key)
+            if dataset is None:
+                dataset = load(path)
+                _datasets.clear()
+                _datasets[key] = dataset
+    return dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare the columnar reference dataset for the Dataset page.")
+    parser.add_argument('source', nargs='?', default=DATASET_PATH, type=Path)
+    parser.add_argument('--cache-dir', default=REFERENCE_CACHE_DIR, type=Path)
+    args = parser.parse_args(argv)
+    print(prepare(args.source, args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Multi-core batch scoring of large patient extracts laid out like OHCA.csv.
+
+For nightly population screening, without the Streamlit UI::
+
+    python -m cardialyze.screening extract.csv scored.parquet --workers 8 --chunk-rows 100000
+
+The input is read in fixed-size chunks. Each chunk is encoded with the app's
+categorical mapping (``cardialyze.features.encode_source_frame``, raw UCI
+codes such as ``cp`` 1-4) and scored on a process pool. Every worker loads
+the model once, with XGBoost pinned to ``--threads-per-worker`` threads so
+the workers do not oversubscribe the cores. Workers are spawned rather than
+forked, so none of them inherits an OpenMP runtime already started by the
+parent.
+
+Scored chunks are written in input order, to CSV or Parquet (picked from the
+output suffix), with a ``Result`` column in percent. Formatting CSV costs
+several times more than scoring, so the workers also serialize their chunk
+and the parent process only parses the input and appends the results. At
+most two chunks per worker are in flight, so memory stays constant whatever
+the size of the input.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from cardialyze.features import encode_source_frame
+from cardialyze.model_artifact import load_model_file
+from cardialyze.model_registry import MODEL_PATH
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Chunks queued per worker: one being scored, one waiting
+CHUNKS_PER_WORKER = 2
+
+_worker_model = None
+
+
+def _init_worker(model_path, threads):
+    global _worker_model
+    # Spawned workers first import xgboost in the model load below, so its OpenMP runtime reads this.
+    # The nthread parameter set after the load is what limits the booster itself
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    model = load_model_file(model_path)
+    # Older pickles miss parameters that set_params() validates, so set the attribute directly
+    model.n_jobs = threads
+    model.get_booster().set_param({'nthread': threads})
+    _worker_model = model
+
+
+def _score_chunk(chunk, as_csv, header):
+    """Add the ``Result`` column (percent, 2 decimals) to a chunk, as CSV bytes if ``as_csv``."""
+    chunk['Result'] = (_worker_model.predict_proba(encode_source_frame(chunk))[:, 1] * 100).round(2)
+    if as_csv:
+        return chunk.to_csv(index=False, header=header).encode('utf-8')
+    return chunk
+
+
+class _InProcessPool:
+    """Runs chunks in the calling process, for ``--workers 0``."""
+
+    def __init__(self, model_path, threads):
+        _init_worker(model_path, threads)
+
+    def submit(self, fn, *args):
+        return _Done(fn(*args))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Done:
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+
+class _CsvWriter:
+    # Chunks arrive already formatted by the workers
+    as_csv = True
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    as_csv = False
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            # Later chunks follow the first chunk's schema, even if pandas inferred other dtypes
+            table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path):
+    suffix = Path(path).suffix.lower()
+    if suffix == '.parquet':
+        return _ParquetWriter(path)
+    if suffix == '.csv':
+        return _CsvWriter(path)
+    raise ValueError(f"Unsupported output format {suffix!r} (use .csv or .parquet)")
+
+
+def score_file(source, dest, workers=None, threads_per_worker=1, chunk_rows=DEFAULT_CHUNK_ROWS,
+               model_path=MODEL_PATH, progress=None):
+    """Score the OHCA.csv-layout CSV ``source`` into ``dest`` (.csv or .parquet).
+
+    ``progress`` is called with the number of rows written so far after each
+    chunk. Returns the total number of rows scored.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(model_path, threads_per_worker))
+    else:
+        pool = _InProcessPool(model_path, threads_per_worker)
+
+    writer = open_writer(dest)
+    pending = deque()
+    rows = 0
+
+    def write_oldest():
+        nonlocal rows
+        chunk_rows, future = pending.popleft()
+        writer.write(future.result())
+        rows += chunk_rows
+        if progress is not None:
+            progress(rows)
+
+    try:
+        with pool:
+            for i, chunk in enumerate(pd.read_csv(source, chunksize=chunk_rows)):
+                future = pool.submit(_score_chunk, chunk, writer.as_csv, i == 0)
+                pending.append((len(chunk), future))
+                if len(pending) >= max(workers, 1) * CHUNKS_PER_WORKER:
+                    write_oldest()
+            while pending:
+                write_oldest()
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a large OHCA.csv-layout extract on all cores.")
+    parser.add_argument('source', type=Path)
+    parser.add_argument('dest', type=Path, help="output file, .csv or .parquet")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="scoring processes (0 scores in this process)")
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--model', type=Path, default=MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def report(rows):
+        elapsed = time.perf_counter() - started
+        print(f"\rScored {rows:,} rows ({rows / elapsed:,.0f} rows/s)", end='', file=sys.stderr, flush=True)
+
+    try:
+        rows = score_file(args.source, args.dest, args.workers, args.threads_per_worker, args.chunk_rows,
+                          args.model, progress=report)
+    except ValueError as e:
+        parser.exit(1, f"\nCould not score {args.source}: {e}\n")
+    print(f"\nWrote {rows:,} rows to {args.dest} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Headless scoring service for integrations that cannot use the Streamlit UI.
+
+A small asyncio HTTP/1.1 server (standard library only) meant to run on
+localhost next to the app::
+
+    python -m cardialyze.service --port 8502 --max-batch-size 64 --max-wait-ms 5
+
+Endpoints:
+
+* ``POST /predict`` with one patient as JSON, keyed like the history records
+  (``{"Age": 54, "Gender": "Male", "Chest Pain Type": "Asymptomatic", ...}``).
+  Returns ``{"probability": 0.71, "result": "71.00%", "model_version": "..."}``.
+* ``GET /health`` returns the model version and micro-batching statistics.
+
+Concurrent requests are queued and scored together: the batcher waits at most
+``max_wait`` seconds after the first queued request, or until
+``max_batch_size`` requests are waiting, and then makes a single
+``predict_proba`` call for the whole batch.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+
+from cardialyze.features import encode_record
+from cardialyze.model_registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    """Coalesces single-row predictions into batched ``predict_proba`` calls."""
+
+    def __init__(self, registry, max_batch_size=64, max_wait=0.005):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, row):
+        """Queue one encoded feature row and wait for its (probability, model version)."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            rows = np.vstack([row for row, _ in batch])
+            try:
+                # The booster releases the GIL, so scoring off the event loop keeps I/O flowing
+                entry = await loop.run_in_executor(None, self.registry.get)
+                probabilities = await loop.run_in_executor(None, entry.predictor.predict_proba, rows)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), probability in zip(batch, probabilities[:, 1]):
+                if not future.done():
+                    future.set_result((float(probability), entry.version))
+
+
+class ScoringServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.started_at = time.time()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Invalid Content-Length'}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'Request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.dispatch(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        if path == '/predict':
+            if method != 'POST':
+                return 405, {'error': 'Use POST'}
+            try:
+                record = json.loads(body)
+                if not isinstance(record, dict):
+                    raise ValueError("Expected a JSON object with one patient")
+                row = encode_record(record)
+            except (TypeError, KeyError, ValueError) as e:
+                # TypeError: a list or object where a single value is expected (unhashable label)
+                return 400, {'error': f"Invalid patient record: {e}"}
+            try:
+                probability, model_version = await self.batcher.predict(row)
+            except Exception:
+                logger.exception("Prediction failed")
+                return 500, {'error': 'Prediction failed'}
+            return 200, {'probability': probability, 'result': f"{probability * 100:.2f}%",
+                         'model_version': model_version}
+
+        if path == '/health':
+            entry = self.batcher.registry.current
+            batches = self.batcher.batches
+            return 200, {
+                'status': 'ok',
+                'model_version': entry.version if entry else None,
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'batches': batches,
+                'rows': self.batcher.rows,
+                'mean_batch_size': round(self.batcher.rows / batches, 2) if batches else 0,
+            }
+
+        return 404, {'error': f'No route for {path}'}
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8502, max_batch_size=64, max_wait=0.005):
+    registry = get_registry()
+    entry = registry.get()
+    logger.info("Serving model %s on http://%s:%d", entry.version, host, port)
+
+    batcher = MicroBatcher(registry, max_batch_size=max_batch_size, max_wait=max_wait)
+    batcher.start()
+    server = await asyncio.start_server(ScoringServer(batcher).handle_connection, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Cardialyze scoring service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
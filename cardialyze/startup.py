@@ -0,0 +1,107 @@
+"""Cold-start helpers: lazy imports and a background pre-warm.
+
+The app scales to zero, so the first request after a deploy pays for every
+import and every artifact load. Two things keep that off the request path:
+
+* ``lazy_import()`` returns a module proxy that imports on first attribute
+  access, so a page only pays for plotly & co. when it actually draws,
+* ``prewarm()`` loads the model (which imports xgboost) and the Dataset
+  page's reference artifacts in a daemon thread the first time any page
+  runs, while the user is still looking at the first screen.
+
+Set ``CARDIALYZE_PREWARM=0`` to disable the pre-warm.
+``benchmarks/import_time_report.py`` checks each page's imports against a
+budget with ``python -X importtime``.
+"""
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+PREWARM = os.environ.get("CARDIALYZE_PREWARM", "1") != "0"
+
+# Modules imported by the pre-warm thread besides the ones the loaders pull in
+PREWARM_MODULES = ['plotly.express', 'plotly.graph_objects']
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            # import_module takes the import lock, so racing sessions import once
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """The module ``name`` if it is already imported, a ``LazyModule`` for it otherwise."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def _load_model():
+    from cardialyze.model_registry import get_registry
+    get_registry().get()
+
+
+def _load_reference_dataset():
+    from cardialyze.reference_data import get_reference_dataset
+    get_reference_dataset()
+
+
+PREWARM_TASKS = {'model': _load_model, 'reference dataset': _load_reference_dataset}
+
+# Task name -> seconds taken (or the exception raised), filled in by the pre-warm thread
+prewarm_timings = {}
+
+_prewarm_thread = None
+_prewarm_lock = threading.Lock()
+
+
+def _prewarm():
+    from cardialyze.tracing import set_page
+    set_page('startup')
+    for name in PREWARM_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        prewarm_timings[name] = time.perf_counter() - started
+    for name, task in PREWARM_TASKS.items():
+        started = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            # Pages load the same artifacts themselves and surface the error there
+            logger.warning("Pre-warm of the %s failed: %s", name, e)
+            prewarm_timings[name] = e
+        else:
+            prewarm_timings[name] = time.perf_counter() - started
+
+
+def prewarm():
+    """Start the background pre-warm once per process. Cheap to call on every rerun."""
+    global _prewarm_thread
+    if not PREWARM or _prewarm_thread is not None:
+        return _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=_prewarm, name='cardialyze-prewarm', daemon=True)
+            _prewarm_thread.start()
+    return _prewarm_thread
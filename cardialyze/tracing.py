@@ -0,0 +1,135 @@
+"""Lightweight timing spans for the hot sections of each rerun.
+
+Wrap a section in ``with span('name'):`` or decorate a function with
+``@traced('name')``. Every finished span is appended to a bounded,
+process-wide ring buffer, tagged with the page and Streamlit session that
+ran it (see ``set_page()``). From there the diagnostics view (the Dashboard
+with ``?diagnostics=1`` in the URL) shows p50/p95/p99 per page and span, and
+can export them as Prometheus text or JSON lines.
+
+Set ``CARDIALYZE_TRACING=0`` to turn it off. ``span()`` then hands out one
+shared no-op context manager, and ``traced()`` returns the function
+unchanged, so disabled tracing costs nothing.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+TRACING = os.environ.get("CARDIALYZE_TRACING", "1") != "0"
+
+# Finished spans kept in memory, oldest dropped first
+RING_SIZE = 20_000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+SpanRecord = namedtuple('SpanRecord', 'finished_at session page name seconds')
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    def __init__(self, size=RING_SIZE):
+        # deque.append is atomic, so recording needs no lock
+        self.records = deque(maxlen=size)
+        self._context = threading.local()
+
+    def set_page(self, page):
+        """Tag spans recorded by this thread with ``page`` and the current Streamlit session."""
+        self._context.page = page
+        self._context.session = _session_id()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            context = self._context
+            self.records.append(SpanRecord(time.time(), getattr(context, 'session', None),
+                                           getattr(context, 'page', None), name,
+                                           time.perf_counter() - started))
+
+    def snapshot(self, session=None):
+        records = list(self.records)
+        return [record for record in records if record.session == session] if session else records
+
+    def sessions(self):
+        return sorted({record.session for record in list(self.records) if record.session})
+
+    def stats(self, session=None):
+        """Count, total and quantiles (seconds) per ``(page, span)``, busiest first."""
+        groups = {}
+        for record in self.snapshot(session):
+            groups.setdefault((record.page or '', record.name), []).append(record.seconds)
+        rows = []
+        for (page, name), durations in groups.items():
+            durations = np.asarray(durations)
+            quantiles = np.quantile(durations, QUANTILES)
+            rows.append({'page': page, 'span': name, 'count': len(durations), 'sum': float(durations.sum()),
+                         **{f'p{round(q * 100)}': float(value) for q, value in zip(QUANTILES, quantiles)}})
+        return sorted(rows, key=lambda row: row['sum'], reverse=True)
+
+    def to_prometheus(self, session=None):
+        """Span durations in the Prometheus text exposition format (as a summary per page and span)."""
+        lines = ['# HELP cardialyze_span_seconds Duration of traced sections of a rerun.',
+                 '# TYPE cardialyze_span_seconds summary']
+        for row in self.stats(session):
+            labels = f'page="{_escape(row["page"])}",span="{_escape(row["span"])}"'
+            for q in QUANTILES:
+                lines.append(f'cardialyze_span_seconds{{{labels},quantile="{q}"}} {row[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'cardialyze_span_seconds_sum{{{labels}}} {row["sum"]:.6f}')
+            lines.append(f'cardialyze_span_seconds_count{{{labels}}} {row["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def iter_jsonl(self, session=None):
+        """One JSON object per recorded span, oldest first."""
+        for record in self.snapshot(session):
+            yield json.dumps(record._asdict()) + '\n'
+
+    def clear(self):
+        self.records.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+tracer = Tracer()
+
+
+def set_page(page):
+    if TRACING:
+        tracer.set_page(page)
+
+
+def span(name):
+    return tracer.span(name) if TRACING else _NULL_SPAN
+
+
+def traced(name):
+    """Decorator recording every call of the function as span ``name``."""
+    def decorator(fn):
+        if not TRACING:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,343 @@
+"""Reproducible, stage-cached training pipeline for the cardiac model.
+
+Replaces the Colab notebooks under ``MLmodel-ipynb/`` with a local script::
+
+    python -m cardialyze.training OHCA.csv --search --output xgb_model_latest.ubj
+
+The pipeline runs the notebooks' steps as separate stages:
+
+    ingest -> clean -> smote -> split -> [search] -> fit -> evaluate
+
+Each stage is cached under ``PIPELINE_CACHE_DIR/<stage>-<key>/``. The key
+hashes the stage's parameters and the keys of the stages it reads from, and
+ingest's key hashes the source file. Editing a parameter therefore reruns
+only that stage and the ones after it, and an unchanged run is read straight
+from disk. Stage outputs are DataFrames (Parquet), dicts (JSON) or models
+(native XGBoost format). They are written into a scratch directory and moved
+into place, like the reference dataset artifacts.
+
+Differences from ``best_model.ipynb``, on purpose:
+
+* features are encoded exactly as the app encodes patients
+  (``cardialyze.features``, 0-based category codes) and are **not** scaled.
+  The notebook fitted on ``StandardScaler`` output, which the app never
+  applies, so its model saw inputs it was not trained on,
+* SMOTE's interpolated category codes are rounded back to valid codes,
+* every fit uses the ``hist`` tree method.
+
+The optional hyperparameter search cross-validates every combination of
+``SEARCH_GRID`` on the training split. All ``(combination, fold)`` fits run in
+parallel across the cores, with each XGBoost fit pinned to one thread.
+
+The result is written with ``cardialyze.model_artifact.write_native``: the
+same ``.ubj`` plus manifest the app loads, with the configuration, stage keys
+and test metrics recorded under ``training``. The pipeline needs
+scikit-learn and imbalanced-learn, which the app itself does not.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from cardialyze import ingestion
+from cardialyze.features import CATEGORIES, FEATURE_COLUMNS, encode_source_frame
+from cardialyze.model_artifact import write_native
+from cardialyze.reference_data import DATASET_PATH, file_checksum
+
+PIPELINE_CACHE_DIR = Path(os.environ.get("CARDIALYZE_PIPELINE_CACHE",
+                                         Path(__file__).resolve().parent.parent / ".pipeline_cache"))
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parent.parent / "xgb_model_latest.ubj"
+
+# Bumped whenever a stage's code changes its output, so older cache entries are ignored
+PIPELINE_VERSION = 2
+
+TARGET = 'output'
+
+# Hyperparameters of the shipped model (best_model.ipynb)
+DEFAULT_PARAMS = {'n_estimators': 23, 'learning_rate': 0.2, 'max_depth': 4, 'min_child_weight': 5}
+
+SEARCH_GRID = {
+    'n_estimators': [23, 50, 100, 200],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'max_depth': [3, 4, 6, 9],
+    'min_child_weight': [1, 5, 19],
+}
+
+
+@dataclass(frozen=True)
+class TrainingConfig:
+    source: Path = DATASET_PATH
+    smote_seed: int = 42
+    test_size: float = 0.3
+    split_seed: int = 0
+    model_seed: int = 0
+    params: Dict[str, Any] = field(default_factory=lambda: dict(DEFAULT_PARAMS))
+    # Cross-validated grid search over SEARCH_GRID instead of the fixed params
+    search: bool = False
+    cv_folds: int = 5
+    # Parallel fits during the search, and XGBoost threads of the final fit (None: all cores)
+    n_jobs: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class StageResult:
+    name: str
+    key: str
+    outputs: Dict[str, Any]
+    cached: bool
+    seconds: float
+
+
+class StageCache:
+    """Stage outputs on disk, addressed by a hash of the stage's inputs and parameters."""
+
+    def __init__(self, cache_dir=PIPELINE_CACHE_DIR, force=False):
+        self.cache_dir = Path(cache_dir)
+        self.force = force
+        self.results = []
+
+    @staticmethod
+    def key(name, params, inputs=()):
+        payload = json.dumps({'stage': name, 'version': PIPELINE_VERSION, 'params': params,
+                              'inputs': [result.key for result in inputs]}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def run(self, name, params, inputs, build):
+        """Outputs of stage ``name``: loaded from the cache, or ``build(*upstream outputs)`` written to it."""
+        key = self.key(name, params, inputs)
+        target = self.cache_dir / f'{name}-{key[:16]}'
+        started = time.perf_counter()
+        cached = (target / 'stage.json').exists() and not self.force
+        if cached:
+            outputs = _read_outputs(target)
+        else:
+            outputs = build(*[result.outputs for result in inputs])
+            _write_outputs(self.cache_dir, target, name, key, params, outputs)
+        result = StageResult(name, key, outputs, cached, time.perf_counter() - started)
+        self.results.append(result)
+        return result
+
+
+def _write_outputs(cache_dir, target, name, key, params, outputs):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(dir=cache_dir, prefix='.stage-'))
+    try:
+        kinds = {}
+        for output, value in outputs.items():
+            if isinstance(value, pd.DataFrame):
+                value.to_parquet(scratch / f'{output}.parquet', index=False)
+                kinds[output] = 'parquet'
+            elif isinstance(value, dict):
+                (scratch / f'{output}.json').write_text(json.dumps(value, indent=2, default=str))
+                kinds[output] = 'json'
+            else:
+                value.save_model(scratch / f'{output}.ubj')
+                kinds[output] = 'ubj'
+        # Written last, marks the directory as complete
+        (scratch / 'stage.json').write_text(json.dumps({'stage': name, 'key': key, 'params': params,
+                                                        'outputs': kinds}, indent=2, default=str))
+        if target.exists():
+            shutil.rmtree(target)
+        try:
+            scratch.rename(target)
+        except OSError:
+            # Another run finished the same stage first
+            if not (target / 'stage.json').exists():
+                raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _read_outputs(target):
+    import xgboost as xgb
+
+    outputs = {}
+    for output, kind in json.loads((target / 'stage.json').read_text())['outputs'].items():
+        if kind == 'parquet':
+            outputs[output] = pd.read_parquet(target / f'{output}.parquet')
+        elif kind == 'json':
+            outputs[output] = json.loads((target / f'{output}.json').read_text())
+        else:
+            model = xgb.XGBClassifier()
+            model.load_model(target / f'{output}.ubj')
+            outputs[output] = model
+    return outputs
+
+
+def _split_xy(frame):
+    return frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64), frame[TARGET].to_numpy()
+
+
+def _classifier(params, seed, n_jobs):
+    import xgboost as xgb
+
+    return xgb.XGBClassifier(tree_method='hist', random_state=seed, n_jobs=n_jobs, **params)
+
+
+def ingest(source):
+    """Read the raw UCI-layout file, with ``?`` as missing (see ``cardialyze.ingestion``)."""
+    return {'raw': ingestion.read_sources([source])}
+
+
+def clean(raw):
+    """Binarize the target, impute, drop duplicates and encode the features like the app does."""
+    df = ingestion.clean(raw)
+    encoded = pd.DataFrame(encode_source_frame(df), columns=FEATURE_COLUMNS)
+    encoded[TARGET] = df[TARGET].to_numpy()
+    return {'encoded': encoded}
+
+
+def smote(encoded, seed):
+    """Oversample the minority class, keeping the category columns on valid codes."""
+    from imblearn.over_sampling import SMOTE
+
+    X, y = _split_xy(encoded)
+    X_resampled, y_resampled = SMOTE(random_state=seed).fit_resample(X, y)
+    balanced = pd.DataFrame(X_resampled, columns=FEATURE_COLUMNS)
+    for col in CATEGORIES:
+        balanced[col] = balanced[col].round().clip(0, len(CATEGORIES[col]) - 1)
+    balanced[TARGET] = y_resampled
+    return {'balanced': balanced}
+
+
+def split(balanced, test_size, seed):
+    from sklearn.model_selection import train_test_split
+
+    train, test = train_test_split(balanced, test_size=test_size, random_state=seed)
+    return {'train': train.reset_index(drop=True), 'test': test.reset_index(drop=True)}
+
+
+def _cv_score(params, X, y, train_index, test_index, seed):
+    from sklearn.metrics import roc_auc_score
+
+    model = _classifier(params, seed, n_jobs=1)
+    model.fit(X[train_index], y[train_index])
+    return roc_auc_score(y[test_index], model.predict_proba(X[test_index])[:, 1])
+
+
+def search(train, grid, folds, seed, n_jobs):
+    """Cross-validated ROC AUC of every ``grid`` combination, fitted in parallel. Returns the best params."""
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+    X, y = _split_xy(train)
+    candidates = list(ParameterGrid(grid))
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+    scores = Parallel(n_jobs=n_jobs or -1)(
+        delayed(_cv_score)(params, X, y, train_index, test_index, seed)
+        for params in candidates for train_index, test_index in splits)
+
+    scores = np.asarray(scores).reshape(len(candidates), folds)
+    results = pd.DataFrame(candidates)
+    results['mean_auc'] = scores.mean(axis=1)
+    results['std_auc'] = scores.std(axis=1)
+    best = int(results['mean_auc'].idxmax())
+    best_params = {name: candidates[best][name] for name in grid}
+    return {'best': {'params': best_params, 'mean_auc': float(results['mean_auc'][best])},
+            'results': results.sort_values('mean_auc', ascending=False).reset_index(drop=True)}
+
+
+def fit(train, params, seed, n_jobs):
+    X, y = _split_xy(train)
+    model = _classifier(params, seed, n_jobs)
+    model.fit(X, y)
+    return {'model': model}
+
+
+def evaluate(model, train, test):
+    """Accuracy on both splits, and precision, recall, F1, ROC AUC and the confusion matrix on the test split."""
+    from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support, roc_auc_score
+
+    X_train, y_train = _split_xy(train)
+    X_test, y_test = _split_xy(test)
+    probabilities = model.predict_proba(X_test)[:, 1]
+    predicted = (probabilities >= 0.5).astype(np.int64)
+    precision, recall, f1, _ = precision_recall_fscore_support(y_test, predicted, average='binary')
+    return {'metrics': {
+        'train_accuracy': float(accuracy_score(y_train, model.predict(X_train))),
+        'test_accuracy': float(accuracy_score(y_test, predicted)),
+        'precision': float(precision),
+        'recall': float(recall),
+        'f1': float(f1),
+        'roc_auc': float(roc_auc_score(y_test, probabilities)),
+        # Rows: actual no presence / presence, columns: predicted
+        'confusion_matrix': confusion_matrix(y_test, predicted).tolist(),
+    }}
+
+
+def run(config=TrainingConfig(), output=DEFAULT_OUTPUT, cache_dir=PIPELINE_CACHE_DIR, force=False):
+    """Run every stage (reusing cached ones) and write the model artifact. Returns ``(manifest, cache)``."""
+    cache = StageCache(cache_dir, force)
+    source = Path(config.source)
+    ingested = cache.run('ingest', {'source_sha256': file_checksum(source)}, [], lambda: ingest(source))
+    cleaned = cache.run('clean', {}, [ingested], lambda outputs: clean(outputs['raw']))
+    balanced = cache.run('smote', {'seed': config.smote_seed}, [cleaned],
+                         lambda outputs: smote(outputs['encoded'], config.smote_seed))
+    splits = cache.run('split', {'test_size': config.test_size, 'seed': config.split_seed}, [balanced],
+                       lambda outputs: split(outputs['balanced'], config.test_size, config.split_seed))
+
+    params = config.params
+    if config.search:
+        # n_jobs only changes the speed, not the result, so it is left out of the key
+        searched = cache.run('search', {'grid': SEARCH_GRID, 'folds': config.cv_folds, 'seed': config.model_seed},
+                             [splits], lambda outputs: search(outputs['train'], SEARCH_GRID, config.cv_folds,
+                                                              config.model_seed, config.n_jobs))
+        params = searched.outputs['best']['params']
+
+    fitted = cache.run('fit', {'params': params, 'seed': config.model_seed}, [splits],
+                       lambda outputs: fit(outputs['train'], params, config.model_seed, config.n_jobs))
+    evaluated = cache.run('evaluate', {}, [fitted, splits],
+                          lambda fit_outputs, split_outputs: evaluate(fit_outputs['model'], split_outputs['train'],
+                                                                      split_outputs['test']))
+
+    # The pickle the app served before this artifact, so it is not mistaken for a newer model (see
+    # cardialyze.model_registry.default_model_path)
+    replaced = Path(output).with_suffix('.pkl')
+    training = {
+        'pipeline_version': PIPELINE_VERSION,
+        'config': {**asdict(config), 'source': source.name, 'params': params},
+        'stages': {result.name: result.key[:16] for result in cache.results},
+        'rows': {'clean': len(cleaned.outputs['encoded']), 'train': len(splits.outputs['train']),
+                 'test': len(splits.outputs['test'])},
+        'metrics': evaluated.outputs['metrics'],
+        'replaces_pickle': ({'path': replaced.name, 'sha256': file_checksum(replaced)} if replaced.exists()
+                            else None),
+    }
+    manifest = write_native(fitted.outputs['model'], output, training=training,
+                            source={'kind': 'dataset', 'path': source.name, 'sha256': file_checksum(source)})
+    return manifest, cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the cardiac model and write the artifact the app loads.")
+    parser.add_argument('source', nargs='?', default=DATASET_PATH, type=Path)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, type=Path, help="model artifact (.ubj or .json)")
+    parser.add_argument('--search', action='store_true', help="cross-validated grid search over SEARCH_GRID")
+    parser.add_argument('--cv-folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=None, help="parallel fits / XGBoost threads (default: all cores)")
+    parser.add_argument('--cache-dir', default=PIPELINE_CACHE_DIR, type=Path)
+    parser.add_argument('--force', action='store_true', help="rerun every stage, ignoring the cache")
+    args = parser.parse_args(argv)
+
+    config = TrainingConfig(source=args.source, search=args.search, cv_folds=args.cv_folds, n_jobs=args.jobs)
+    manifest, cache = run(config, args.output, args.cache_dir, args.force)
+    for result in cache.results:
+        print(f"{result.name:<9} {result.key[:16]}  {'cached' if result.cached else 'ran':<6} {result.seconds:6.2f}s")
+    metrics = manifest['training']['metrics']
+    print(f"Test accuracy {metrics['test_accuracy']:.2%}, ROC AUC {metrics['roc_auc']:.3f}, "
+          f"params {manifest['training']['config']['params']}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""What-if sensitivity sweeps around one patient.
+
+One or two inputs of the current patient are varied over a grid while the
+other inputs stay fixed. Numeric inputs span their form bounds
+(``NUMERIC_BOUNDS``) and categorical inputs take every label. The grid is
+encoded straight into one feature matrix, by tiling the patient's encoded
+row and overwriting the swept columns, and scored with a single
+``predict_proba`` call. A 100 x 100 grid is one 10,000-row batch.
+"""
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from cardialyze.features import CATEGORIES, FEATURE_COLUMNS, NUMERIC_BOUNDS, encode_record
+
+# Inputs that can be swept: every model feature
+SWEEP_FEATURES = FEATURE_COLUMNS
+
+# Numeric inputs with one decimal place, the others are whole numbers
+DECIMAL_FEATURES = {'Oldpeak'}
+
+
+@dataclass(frozen=True)
+class Sweep:
+    features: List[str]
+    # Grid values of each swept feature: numbers for numeric inputs, labels for categorical ones
+    values: List[list]
+    # Probability in percent, shape (len(values[0]),) or (len(values[0]), len(values[1]))
+    risk: np.ndarray
+
+
+def grid_values(feature, points):
+    """Values of ``feature`` covered by the sweep, with at most ``points`` numeric steps."""
+    if feature in CATEGORIES:
+        return list(CATEGORIES[feature])
+    low, high = NUMERIC_BOUNDS[feature]
+    values = np.linspace(low, high, points)
+    if feature in DECIMAL_FEATURES:
+        return np.unique(values.round(1)).tolist()
+    return np.unique(values.round()).astype(int).tolist()
+
+
+def _codes(feature, values):
+    return np.arange(len(values), dtype=np.float64) if feature in CATEGORIES else np.asarray(values, dtype=np.float64)
+
+
+def sweep(predictor, record, features, points=50):
+    """Score ``record`` with one or two of its ``features`` varied over a grid, in one batch."""
+    if not 1 <= len(features) <= 2:
+        raise ValueError("Select one or two features to sweep")
+    base = encode_record(record)
+    values = [grid_values(feature, points) for feature in features]
+    axes = np.meshgrid(*[_codes(feature, grid) for feature, grid in zip(features, values)], indexing='ij')
+
+    matrix = np.tile(base, (axes[0].size, 1))
+    for feature, axis in zip(features, axes):
+        matrix[:, FEATURE_COLUMNS.index(feature)] = axis.ravel()
+    risk = predictor.predict_proba(matrix)[:, 1] * 100
+    return Sweep(list(features), values, risk.reshape(axes[0].shape))
@@ -1,14 +1,36 @@
 import streamlit as st
-import joblib
-import numpy as np
 import pandas as pd
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
+from cardialyze.startup import lazy_import, prewarm
+from cardialyze.tracing import set_page, span, traced
+from cardialyze.features import CATEGORIES, FEATURE_COLUMNS, FORM_OPTIONS, NUMERIC_BOUNDS, encode_record
+
+# plotly is only imported once the what-if chart is drawn, and the model, inference, history and export
+# modules (joblib, the compiled ensemble, sqlite, ...) once the page first uses them, usually after the
+# pre-warm thread has already loaded them
+go = lazy_import('plotly.graph_objects')
+batch = lazy_import('cardialyze.batch')
+contributions = lazy_import('cardialyze.contributions')
+export = lazy_import('cardialyze.export')
+history_store = lazy_import('cardialyze.history_store')
+inference = lazy_import('cardialyze.inference')
+model_registry = lazy_import('cardialyze.model_registry')
+prediction_cache = lazy_import('cardialyze.prediction_cache')
+what_if = lazy_import('cardialyze.what_if')
 
 # Define the interface and functions
 def main():
-    # Load the trained XGBoost model
-    xgb_model = joblib.load(r"xgb_model_latest.pkl")
+    # The trained XGBoost model is loaded once per server process and shared by all sessions.
+    # Loading it (and importing xgboost) starts in the background, the form does not wait for it
+    prewarm()
+    set_page('Prognose')
+    registry = model_registry.get_registry()
+
+    # Every prediction goes through the shared inference executor, so concurrent sessions queue for a
+    # fixed pool of workers instead of each starting XGBoost threads on all cores
+    def queued_model():
+        return inference.get_inference_executor().bind(registry.get())
 
     st.title("Cardiac Arrest Risk Prognosticator")
 
@@ -35,9 +57,7 @@ def main():
     #NEWEST CHANGE
     if 'current_result' not in st.session_state:
         st.session_state['current_result'] = None
-    #NEWEST CHANGE
-    if 'history' not in st.session_state:
-        st.session_state['history'] = []
+        st.session_state['current_contributions'] = None
 
     def reset_inputs():
         st.session_state['inputs'] = {
@@ -56,6 +76,7 @@ def main():
             'st_slope': 'Upsloping'
         }
         st.session_state['current_result'] = None
+        st.session_state['current_contributions'] = None
 
     # Get user input for patient name
     st.session_state['inputs']['name'] = st.text_input("Patient Name:", value=st.session_state['inputs']['name'])
@@ -64,61 +85,43 @@ def main():
     st.session_state['inputs']['ic_number'] = st.text_input("Identification Number (with '-'):", value=st.session_state['inputs']['ic_number'])
 
     # Get user input for age
-    st.session_state['inputs']['age'] = st.number_input("Age (years):", min_value=28, max_value=77, value=st.session_state['inputs']['age'])
+    st.session_state['inputs']['age'] = st.number_input("Age (years):", *NUMERIC_BOUNDS['Age'], value=st.session_state['inputs']['age'])
 
     # Get user input for gender
-    st.session_state['inputs']['gender'] = st.selectbox("Gender:", options=["Male", "Female"], index=["Male", "Female"].index(st.session_state['inputs']['gender']))
+    st.session_state['inputs']['gender'] = st.selectbox("Gender:", options=FORM_OPTIONS['Gender'], index=FORM_OPTIONS['Gender'].index(st.session_state['inputs']['gender']))
 
     # Get user input for chest pain type
     st.session_state['inputs']['chest_pain_type'] = st.selectbox("Chest Pain Type:",
-                                   options=["Typical Angina", "Atypical Angina", "Non-Anginal Pain", "Asymptomatic"], index=["Typical Angina", "Atypical Angina", "Non-Anginal Pain", "Asymptomatic"].index(st.session_state['inputs']['chest_pain_type']))
+                                   options=FORM_OPTIONS['Chest Pain Type'], index=FORM_OPTIONS['Chest Pain Type'].index(st.session_state['inputs']['chest_pain_type']))
 
     # Get user input for resting blood pressure
-    st.session_state['inputs']['resting_blood_pressure'] = st.number_input("Resting Blood Pressure (mm Hg):", min_value=92, max_value=170, value=st.session_state['inputs']['resting_blood_pressure'])
+    st.session_state['inputs']['resting_blood_pressure'] = st.number_input("Resting Blood Pressure (mm Hg):", *NUMERIC_BOUNDS['Resting Blood Pressure'], value=st.session_state['inputs']['resting_blood_pressure'])
 
     # Get user input for serum cholesterol levels
-    st.session_state['inputs']['serum_cholesterol'] = st.number_input("Serum Cholesterol (mg/dl):", min_value=85, max_value=394, value=st.session_state['inputs']['serum_cholesterol'])
+    st.session_state['inputs']['serum_cholesterol'] = st.number_input("Serum Cholesterol (mg/dl):", *NUMERIC_BOUNDS['Serum Cholesterol'], value=st.session_state['inputs']['serum_cholesterol'])
 
     # Get user input for fasting blood sugar levels
-    st.session_state['inputs']['fasting_blood_sugar'] = st.selectbox("Fasting Blood Sugar Level (mg/dl):", options=["Below 120", "Above 120"], index=["Below 120", "Above 120"].index(st.session_state['inputs']['fasting_blood_sugar']))
+    st.session_state['inputs']['fasting_blood_sugar'] = st.selectbox("Fasting Blood Sugar Level (mg/dl):", options=FORM_OPTIONS['Fasting Blood Sugar'], index=FORM_OPTIONS['Fasting Blood Sugar'].index(st.session_state['inputs']['fasting_blood_sugar']))
 
     # Get user input for resting electrocardiogram result
     st.session_state['inputs']['ecg_result'] = st.selectbox("Resting Electrocardiogram Result:",
-                              options=["Normal", "ST-T Wave Abnormality", "Left Ventricular Hypertrophy"], index=["Normal", "ST-T Wave Abnormality", "Left Ventricular Hypertrophy"].index(st.session_state['inputs']['ecg_result']))
+                              options=FORM_OPTIONS['ECG Result'], index=FORM_OPTIONS['ECG Result'].index(st.session_state['inputs']['ecg_result']))
 
     # Get user input for maximum heart rate reached during exercise
-    st.session_state['inputs']['max_heart_rate'] = st.number_input("Maximum Heart Rate (bpm):", min_value=80, max_value=202, value=st.session_state['inputs']['max_heart_rate'])
+    st.session_state['inputs']['max_heart_rate'] = st.number_input("Maximum Heart Rate (bpm):", *NUMERIC_BOUNDS['Max Heart Rate'], value=st.session_state['inputs']['max_heart_rate'])
 
     # Get user input for exercise angina
-    st.session_state['inputs']['exercise_angina'] = st.selectbox("Exercise Angina:", options=["Yes", "No"], index=["Yes", "No"].index(st.session_state['inputs']['exercise_angina']))
+    st.session_state['inputs']['exercise_angina'] = st.selectbox("Exercise Angina:", options=FORM_OPTIONS['Exercise Angina'], index=FORM_OPTIONS['Exercise Angina'].index(st.session_state['inputs']['exercise_angina']))
 
     # Get user input for oldpeak
-    st.session_state['inputs']['oldpeak'] = st.number_input("Oldpeak (mm):", min_value=0.0, max_value=3.6, value=st.session_state['inputs']['oldpeak'])
+    st.session_state['inputs']['oldpeak'] = st.number_input("Oldpeak (mm):", *NUMERIC_BOUNDS['Oldpeak'], value=st.session_state['inputs']['oldpeak'])
 
     # Get user input for ST slope
-    st.session_state['inputs']['st_slope'] = st.selectbox("ST Slope:", options=["Upsloping", "Flat", "Downsloping"], index=["Upsloping", "Flat", "Downsloping"].index(st.session_state['inputs']['st_slope']))
+    st.session_state['inputs']['st_slope'] = st.selectbox("ST Slope:", options=FORM_OPTIONS['ST Slope'], index=FORM_OPTIONS['ST Slope'].index(st.session_state['inputs']['st_slope']))
     
-    # Define a function for calculating the prediction
-    def calculate_prediction():
-        # Convert categorical inputs to numerical
-        gender_num = 1 if st.session_state['inputs']['gender'] == "Male" else 0
-        chest_pain_type_num = ["Typical Angina", "Atypical Angina", "Non-Anginal Pain", "Asymptomatic"].index(st.session_state['inputs']['chest_pain_type'])
-        fasting_blood_sugar_num = 1 if st.session_state['inputs']['fasting_blood_sugar'] == "Above 120" else 0
-        ecg_result_num = ["Normal", "ST-T Wave Abnormality", "Left Ventricular Hypertrophy"].index(st.session_state['inputs']['ecg_result'])
-        exercise_angina_num = 1 if st.session_state['inputs']['exercise_angina'] == "Yes" else 0
-        st_slope_num = ["Upsloping", "Flat", "Downsloping"].index(st.session_state['inputs']['st_slope'])
-
-        # Prepare input for prediction
-        input_data = np.array([[st.session_state['inputs']['age'], gender_num, chest_pain_type_num, st.session_state['inputs']['resting_blood_pressure'], st.session_state['inputs']['serum_cholesterol'],
-                                fasting_blood_sugar_num, ecg_result_num, st.session_state['inputs']['max_heart_rate'],
-                                exercise_angina_num, st.session_state['inputs']['oldpeak'], st_slope_num]])
-
-        # Predict
-        probability = xgb_model.predict_proba(input_data)[0][1]
-        result_col.write(f"There is a {probability * 100:.2f}% chance of developing cardiac arrest.")
-
-        st.session_state['current_result'] = {
-            
+    # Collect the current inputs, keyed like the history columns
+    def current_record():
+        return {
             "Name": st.session_state['inputs']['name'],
             "IC Number": st.session_state['inputs']['ic_number'],
             "Age": st.session_state['inputs']['age'],
@@ -132,10 +135,36 @@ def main():
             "Exercise Angina": st.session_state['inputs']['exercise_angina'],
             "Oldpeak": st.session_state['inputs']['oldpeak'],
             "ST Slope": st.session_state['inputs']['st_slope'],
+        }
+
+    # Define a function for calculating the prediction
+    @traced('calculate_prediction')
+    def calculate_prediction():
+        record = current_record()
+
+        # Convert the inputs to the model's numerical features (shared encoding in cardialyze.features)
+        input_data = encode_record(record).reshape(1, -1)
+
+        # Predict and explain in one TreeSHAP call, reusing an identical earlier request with the same model version
+        try:
+            with span('predict'):
+                probabilities, explained = prediction_cache.get_prediction_cache().explain(queued_model(), input_data)
+            probability = probabilities[0]
+        except inference.InferenceBusy as e:
+            result_col.warning(str(e))
+            return
+        result_col.write(f"There is a {probability * 100:.2f}% chance of developing cardiac arrest.")
+
+        now = datetime.now(ZoneInfo(history_store.TIMEZONE))
+        st.session_state['current_result'] = {
+            **record,
             "Result": f"{probability * 100:.2f}%",
-            "Timestamp": datetime.now(pytz.timezone('Asia/Kuala_Lumpur')).strftime('%Y-%m-%d %H:%M:%S')
+            "Timestamp": now.strftime('%Y-%m-%d %H:%M:%S')
         }
-        st.session_state['history'].append(st.session_state['current_result'])
+        st.session_state['current_contributions'] = explained[0]
+        # Keep the test in the viewer's persistent history, read by the Dashboard and History pages
+        history_store.session_history().append(record, result=round(probability * 100, 2), timestamp=now.timestamp(),
+                                               contributions=explained[0])
 
     # Define your button layout
     buttons_col1, button_col2, result_col = st.columns([1, 5, 4])
@@ -150,7 +179,7 @@ def main():
     # Add reset button
     if button_col2.button("Reset All"):
         reset_inputs()
-        st.experimental_rerun()
+        st.rerun()
 
     st.write("")
     st.write("")
@@ -164,6 +193,82 @@ def main():
         result_df.index = [''] * len(result_df)  # Remove the index
         st.write("Current Test Result:")
         st.dataframe(result_df)
+        # Per-feature contributions of the current result (red raises the risk, green lowers it)
+        if st.session_state['current_contributions'] is not None:
+            st.plotly_chart(contributions.waterfall_figure(st.session_state['current_contributions'],
+                                             st.session_state['current_result']), use_container_width=True)
+
+    # What-if analysis: vary one or two inputs of the current patient, the whole grid is scored in one batch
+    with st.expander("What-if Analysis"):
+        sweep_features = st.multiselect("Inputs to vary (one or two):", what_if.SWEEP_FEATURES,
+                                        max_selections=2)
+        grid_points = st.slider("Grid points per numeric input:", 10, 100, 50)
+        if sweep_features:
+            model = queued_model()
+            record = current_record()
+            # Other widgets rerun the page too, the grid is only scored again when one of its inputs changes
+            sweep_key = (model.version, tuple(record[column] for column in FEATURE_COLUMNS), tuple(sweep_features),
+                         grid_points)
+            cached_sweep = st.session_state.get('what_if')
+            try:
+                if cached_sweep is not None and cached_sweep[0] == sweep_key:
+                    result = cached_sweep[1]
+                else:
+                    with span('what_if'):
+                        result = what_if.sweep(model.predictor, record, sweep_features, grid_points)
+                    st.session_state['what_if'] = (sweep_key, result)
+            except inference.InferenceBusy as e:
+                st.warning(str(e))
+            else:
+                if len(result.features) == 1:
+                    feature = result.features[0]
+                    current_value = record[feature]
+                    if feature in CATEGORIES:
+                        # One bar per label, the patient's current label highlighted
+                        what_if_fig = go.Figure(go.Bar(x=result.values[0], y=result.risk, marker_color=[
+                            'crimson' if value == current_value else 'lightslategray' for value in result.values[0]]))
+                    else:
+                        what_if_fig = go.Figure(go.Scatter(x=result.values[0], y=result.risk, mode='lines+markers'))
+                        what_if_fig.add_vline(x=current_value, line_dash='dash', annotation_text='Current')
+                    what_if_fig.update_layout(title=f'Risk vs {feature}', xaxis_title=feature, yaxis_title='Risk (%)')
+                else:
+                    what_if_fig = go.Figure(go.Heatmap(z=result.risk, y=result.values[0], x=result.values[1],
+                                                       colorscale='Reds', colorbar_title='Risk (%)'))
+                    what_if_fig.update_layout(title=f'Risk by {result.features[0]} and {result.features[1]}',
+                                              yaxis_title=result.features[0], xaxis_title=result.features[1])
+                st.plotly_chart(what_if_fig, use_container_width=True)
+
+    st.write("")
+    # Bulk scoring for spreadsheets of patients
+    with st.expander("Bulk Scoring (CSV Upload)"):
+        st.write("Upload a CSV file with the columns: " + ", ".join(FEATURE_COLUMNS) + ". "
+                 "Categorical columns must use the same labels as the form above. "
+                 "Any other columns are kept, and a Result column (%) is added.")
+        uploaded_file = st.file_uploader("Patient CSV file:", type=["csv"])
+        add_contributions = st.checkbox("Add feature contributions (one column per feature, slower for large files)")
+        if uploaded_file is not None and st.button("Score File"):
+            # Scored chunks go to a temporary file on disk instead of being collected in memory.
+            # Streamlit reads the file it offers for download into memory, so large results are not offered
+            with export.DownloadFile() as scored_file:
+                status = st.empty()
+                try:
+                    total_rows = batch.score_csv(uploaded_file, scored_file, queued_model(),
+                                                 progress=lambda rows: status.write(f"Scored {rows:,} patients..."),
+                                                 contributions=add_contributions)
+                except (ValueError, inference.InferenceBusy) as e:
+                    status.empty()
+                    st.error(f"Could not score the file: {e}")
+                else:
+                    status.write(f"Scored {total_rows:,} patients.")
+                    scored_bytes = scored_file.tell()
+                    if scored_bytes > export.MAX_APP_DOWNLOAD_BYTES:
+                        st.warning(f"The scored file ({scored_bytes / 2 ** 20:,.0f} MB) is larger than the app can "
+                                   f"offer for download ({export.MAX_APP_DOWNLOAD_BYTES / 2 ** 20:,.0f} MB). "
+                                   "Please split the upload into smaller files.")
+                    else:
+                        scored_file.seek(0)
+                        st.download_button("Download Scored CSV", data=scored_file,
+                                           file_name=f"scored_{uploaded_file.name}", mime="text/csv")
 
     # Sidebar feature explanations
     st.sidebar.title("Criteria Information")
@@ -188,6 +293,14 @@ def main():
 
     st.sidebar.write(feature_explanations[feature])
 
+    model_entry = registry.current
+    if model_entry is not None:
+        cache = prediction_cache.get_prediction_cache()
+        st.sidebar.caption(f"Model version {model_entry.version} (loaded in {model_entry.load_seconds * 1000:.0f} ms), "
+                           f"prediction cache hit rate {cache.hit_rate:.0%}")
+    else:
+        st.sidebar.caption("Model loading in the background...")
+
 
 # Run the interface
 if __name__ == "__main__":
@@ -1,70 +1,56 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-# Load the CSV file
-@st.cache_data
-def load_data():
-    df = pd.read_csv(r"OHCA.csv")
-    return df
+from cardialyze.startup import lazy_import, prewarm
+from cardialyze.tracing import set_page
+from cardialyze.figure_cache import get_figure_cache
+from cardialyze.reference_data import CORRELATION_METHODS, get_reference_dataset
+
+# plotly is only imported once a chart is actually drawn
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
 
 # Define the interface and functions
 def main():
+    prewarm()
+    set_page('Dataset')
     st.title("Dataset Overview")
     st.write("This is the overview of the dataset from the CSV file.")
 
-    # Load the data
-    data = load_data()
+    # Load the data, prepared once per version of OHCA.csv (see cardialyze.reference_data)
+    dataset = get_reference_dataset()
 
     # Display the data
     st.write("### Dataset")
-    st.dataframe(data)
-
-    # Map numerical values to gender labels
-    gender_map = {0: 'Male', 1: 'Female'}
-    data['Gender'] = data['sex'].map(gender_map)
+    st.dataframe(dataset.raw)
 
     # Create a Sankey chart to visualize relationships between selected attributes
     st.write("### Features Distribution Between Gender")
 
-     # Map numerical values to labels
-    gender_map = {0: 'Male', 1: 'Female'}
-    cp_map = {1: 'Typical Angina', 2: 'Atypical Angina', 3: 'Non-Anginal Pain', 4: 'Asymptomatic'}
-    fbs_map = {0: 'Below 120', 1: 'Above 120'}
-    restecg_map = {0: 'Normal', 1: 'ST-T Wave Abnormality', 2: 'Left Ventricular Hypertrophy'}
-    exang_map = {0: 'No', 1: 'Yes'}
-    slope_map = {1: 'Upsloping', 2: 'Flat', 3: 'Downsloping'}
-    
-    data['Gender'] = data['sex'].map(gender_map)
-    data['cp'] = data['cp'].map(cp_map)
-    data['fbs'] = data['fbs'].map(fbs_map)
-    data['restecg'] = data['restecg'].map(restecg_map)
-    data['exang'] = data['exang'].map(exang_map)
-    data['slope'] = data['slope'].map(slope_map)
-
-    # Filter out 'Gender' from the list of columns
-    attribute_options = [col for col in data.columns if col != 'Gender' and data[col].dtype == 'object']
+    # Numerical values are already mapped to labels, using the same codes as the model (cardialyze.features)
+    data = dataset.labelled
+
+    # Attributes of the precomputed count cube (every categorical column except 'Gender' and 'output')
+    attribute_options = dataset.cube.attributes
 
     # Select attribute for Sankey chart
     selected_attribute = st.selectbox("Select an attribute:", attribute_options)
-
-    # Group by the selected attribute and gender
-    grouped_data = data.groupby([selected_attribute, 'Gender']).size().reset_index(name='Count')
-
-    # Create Sankey diagram
-    fig = go.Figure(data=[go.Sankey(
-        node=dict(
-            label=grouped_data[selected_attribute].unique().tolist() + grouped_data['Gender'].unique().tolist(),
-        ),
-        link=dict(
-            source=grouped_data[selected_attribute].map(lambda x: grouped_data[selected_attribute].unique().tolist().index(x)),
-            target=grouped_data['Gender'].map(lambda x: len(grouped_data[selected_attribute].unique().tolist()) + grouped_data['Gender'].unique().tolist().index(x)),
-            value=grouped_data['Count']
-        )
-    )])
+    show_output = st.checkbox("Continue the flow to cardiac presence")
+    levels = ('Gender', 'output') if show_output else ('Gender',)
+
+    # Node and link arrays come straight from the count cube, no regrouping of the dataset
+    def build_sankey():
+        sankey = dataset.cube.sankey(selected_attribute, levels)
+        return go.Figure(data=[go.Sankey(
+            node=dict(
+                label=sankey.labels,
+            ),
+            link=dict(
+                source=sankey.source,
+                target=sankey.target,
+                value=sankey.value
+            )
+        )])
+
+    fig = get_figure_cache().get_or_build(('sankey', selected_attribute, levels), dataset.checksum, build_sankey)
 
     st.plotly_chart(fig)
 
@@ -76,9 +62,6 @@ def main():
 
     st.write("### Cardiac Presence Between Gender and Age")
 
-    # Convert the 'output' column values to meaningful labels
-    data['output'] = data['output'].map({0: 'No Presence', 1: 'Presence'})
-
     # Create a double bar chart to show the distribution of age between genders
     fig = px.histogram(data, x='age', color='Gender', facet_col='output', color_discrete_map={'Presence': 'red', 'No Presence': 'blue'},
                        labels={'output': 'Cardiac Arrest', 'age': 'Age', 'Gender': 'Gender'})
@@ -101,19 +84,19 @@ def main():
     # Correlation Heatmap
     st.write("### Correlation Heatmap")
 
-    # Manually encode categorical variables for correlation
-    categorical_columns = data.select_dtypes(include=['object']).columns
-    for col in categorical_columns:
-        data[col] = pd.factorize(data[col])[0]
-
-    # Drop the 'Gender' and 'output' columns for correlation heatmap
-    corr_data = data.drop(columns=['Gender', 'output'])
+    # Correlations of the factorized columns (without 'Gender' and 'output'), computed when the dataset was prepared
+    method = st.radio("Correlation method:", CORRELATION_METHODS, horizontal=True)
+    corr = dataset.correlations[method]
 
-    corr = corr_data.corr()
-    plt.figure(figsize=(15, 8))
-    heatmap = sns.heatmap(corr, annot=True, cmap='coolwarm', center=0)
-    st.pyplot(heatmap.figure)
+    # Native Plotly heatmap, rendered by the browser instead of rasterized with matplotlib on every rerun
+    def build_heatmap():
+        heatmap = go.Figure(go.Heatmap(z=corr.to_numpy(), x=corr.columns.tolist(), y=corr.index.tolist(),
+                                       colorscale='RdBu_r', zmid=0, texttemplate='%{z:.2f}'))
+        heatmap.update_layout(height=600 if method != 'Point-biserial' else 500, yaxis_autorange='reversed')
+        return heatmap
 
+    st.plotly_chart(get_figure_cache().get_or_build(('correlation', method), dataset.checksum, build_heatmap),
+                    use_container_width=True)
 
 # Run the interface
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""The compiled ensemble must reproduce XGBoost's own traversal exactly."""
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from cardialyze.compiled_model import LARGE_BATCH_ROWS, CompiledEnsemble
+from cardialyze.model_artifact import load_model_file
+from cardialyze.model_registry import NATIVE_PATH, PICKLE_PATH, WARMUP_ROW
+
+TOLERANCE = 1e-6
+
+
+@pytest.fixture(scope='module', params=[NATIVE_PATH, PICKLE_PATH], ids=['ubj', 'pickle'])
+def model(request):
+    return load_model_file(request.param)
+
+
+@pytest.fixture(scope='module')
+def compiled(model):
+    return CompiledEnsemble.from_model(model)
+
+
+def booster_probabilities(model, X):
+    return model.get_booster().predict(xgb.DMatrix(X, missing=np.nan))
+
+
+def edge_rows(compiled, rows, seed=0, missing=0.2):
+    """Random rows whose values sit on, just beside or between the split thresholds, with some NaNs."""
+    rng = np.random.default_rng(seed)
+    is_split = compiled.left != compiled.right
+    X = np.empty((rows, compiled.num_features), dtype=np.float64)
+    for feature in range(compiled.num_features):
+        thresholds = compiled.threshold[is_split & (compiled.feature == feature)]
+        if not len(thresholds):
+            X[:, feature] = rng.uniform(-10, 10, rows)
+            continue
+        below = np.nextafter(thresholds, np.float32(-np.inf))
+        above = np.nextafter(thresholds, np.float32(np.inf))
+        # Equal to the threshold once rounded to float32, which is what XGBoost compares
+        rounded = thresholds.astype(np.float64) * (1 + 1e-12)
+        candidates = np.concatenate([thresholds, below, above]).astype(np.float64)
+        candidates = np.concatenate([candidates, rounded, rng.uniform(thresholds.min() - 1, thresholds.max() + 1, 50)])
+        X[:, feature] = rng.choice(candidates, rows)
+    X[rng.random(X.shape) < missing] = np.nan
+    return X
+
+
+def test_matches_booster_on_split_thresholds_and_missing_values(model, compiled):
+    X = edge_rows(compiled, 5000)
+    expected = booster_probabilities(model, X)
+    np.testing.assert_allclose(compiled.evaluate(X)[:, 1], expected, rtol=0, atol=TOLERANCE)
+
+
+def test_all_missing_follows_default_branches(model, compiled):
+    X = np.full((3, compiled.num_features), np.nan)
+    np.testing.assert_allclose(compiled.evaluate(X)[:, 1], booster_probabilities(model, X), rtol=0, atol=TOLERANCE)
+
+
+def test_predict_proba_is_a_drop_in(model, compiled):
+    for rows in [1, LARGE_BATCH_ROWS - 1, LARGE_BATCH_ROWS]:
+        X = edge_rows(compiled, rows, seed=rows, missing=0.0)
+        np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(compiled.predict_proba(WARMUP_ROW), model.predict_proba(WARMUP_ROW), rtol=0,
+                               atol=TOLERANCE)
+
+
+def test_rejects_wrong_width(compiled):
+    with pytest.raises(ValueError):
+        compiled.evaluate(np.zeros((1, compiled.num_features + 1)))
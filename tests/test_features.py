@@ -0,0 +1,16 @@
+"""The Prognose form's option order is independent of the model codes."""
+from cardialyze.features import CATEGORIES, CODES, FORM_OPTIONS
+
+
+def test_form_lists_every_label_once():
+    assert FORM_OPTIONS.keys() == CATEGORIES.keys()
+    for column, labels in CATEGORIES.items():
+        assert sorted(FORM_OPTIONS[column]) == sorted(labels)
+
+
+def test_form_order_and_codes_match_the_original_form():
+    # The form always listed (and defaulted to) Male first, and encoded Male and Yes as 1
+    assert FORM_OPTIONS['Gender'] == ['Male', 'Female']
+    assert FORM_OPTIONS['Exercise Angina'] == ['Yes', 'No']
+    assert CODES['Gender'] == {'Female': 0, 'Male': 1}
+    assert CODES['Exercise Angina'] == {'No': 0, 'Yes': 1}
@@ -0,0 +1,194 @@
+"""HistoryStore filters (pushed down to SQL), keyset pagination and owners."""
+import random
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import pandas as pd
+import pytest
+
+from cardialyze.contributions import CONTRIBUTION_COLUMNS
+from cardialyze.features import CATEGORIES
+from cardialyze.history_store import MAX_TEST, HistoryStore
+
+TESTS = 200
+
+START = 1_700_000_000
+
+
+def record(rng, i):
+    row = {column: rng.choice(labels) for column, labels in CATEGORIES.items()}
+    row.update({
+        'Name': f'Patient {i}',
+        'IC Number': f'IC-{i % 7}',
+        'Age': rng.randint(28, 77),
+        'Resting Blood Pressure': rng.randint(92, 170),
+        'Serum Cholesterol': rng.randint(85, 394),
+        'Max Heart Rate': rng.randint(80, 202),
+        'Oldpeak': round(rng.uniform(0.0, 3.6), 1),
+    })
+    return row
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    store = HistoryStore(tmp_path_factory.mktemp('history') / 'history.db').for_owner('clinic')
+    rng = random.Random(0)
+    for i in range(TESTS):
+        store.append(record(rng, i), result=round(rng.uniform(0, 100), 2), timestamp=START + 3600 * i)
+    yield store
+    store.close()
+
+
+@pytest.fixture(scope='module')
+def everything(store):
+    return store.query()
+
+
+FILTERS = [
+    [('Gender', 'in', ['Female'])],
+    [('Chest Pain Type', 'in', ['Asymptomatic', 'Typical Angina'])],
+    [('Age', 'between', (40, 60))],
+    [('Result', 'between', (25.0, 75.0))],
+    [('Timestamp', 'between', (START + 3600 * 10, START + 3600 * 50))],
+    [('IC Number', 'in', ['IC-3'])],
+    [('Test', 'in', [1, 5, 199])],
+    [('Test', 'between', (150, MAX_TEST))],
+    [('Gender', 'in', ['Male']), ('Age', 'between', (30, 70)), ('ST Slope', 'in', ['Flat', 'Downsloping'])],
+    [('Gender', 'in', [])],
+]
+
+
+def expected_rows(everything, filters):
+    """The same filters applied in pandas to the whole history."""
+    mask = pd.Series(True, index=everything.index)
+    for column, operator, value in filters:
+        if column == 'Test':
+            values = everything.index.to_series()
+        elif column == 'Timestamp':
+            # Stored as epoch seconds, returned formatted: test i was taken at START + 3600 * (i - 1)
+            values = START + 3600 * (everything.index.to_series() - 1)
+        else:
+            values = everything[column]
+        if operator == 'in':
+            mask &= values.isin(list(value))
+        else:
+            mask &= values.between(*value)
+    return everything[mask.to_numpy()]
+
+
+def assert_same_rows(actual, expected):
+    if not len(expected):
+        # An empty result carries no index dtype to compare
+        assert not len(actual) and list(actual.columns) == list(expected.columns)
+        return
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=lambda filters: '+'.join(column for column, _, _ in filters))
+def test_filters_match_pandas(store, everything, filters):
+    expected = expected_rows(everything, filters)
+    actual = store.query(filters=filters)
+    assert list(actual.index) == list(expected.index)
+    assert_same_rows(actual, expected)
+    assert store.count(filters) == len(expected)
+
+
+def test_categorical_columns_keep_their_labels(everything):
+    for column, labels in CATEGORIES.items():
+        assert list(everything[column].cat.categories) == labels
+
+
+def test_limit_offset_and_descending(store, everything):
+    page = store.query(limit=25, offset=50)
+    assert list(page.index) == list(everything.index[50:75])
+    newest = store.query(limit=10, descending=True)
+    assert list(newest.index) == list(everything.index[::-1][:10])
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, TESTS, TESTS + 1])
+@pytest.mark.parametrize('filters', [None] + FILTERS[:4] + FILTERS[-2:], ids=lambda filters: str(bool(filters)))
+def test_iter_query_yields_every_match_once_in_order(store, everything, filters, chunk_rows):
+    expected = expected_rows(everything, filters or [])
+    # Bounded, so pagination that never advances fails instead of hanging
+    chunks = list(islice(store.iter_query(None, filters, chunk_rows), TESTS + 1))
+    assert all(0 < len(chunk) <= chunk_rows for chunk in chunks)
+    combined = pd.concat(chunks) if chunks else store.query(filters=filters, limit=0)
+    assert combined.index.is_unique
+    assert_same_rows(combined, expected)
+
+
+def test_iter_query_selects_columns(store):
+    chunks = list(store.iter_query(['Name', 'Result'], [('Gender', 'in', ['Male'])], 16))
+    assert all(list(chunk.columns) == ['Name', 'Result'] for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == store.count([('Gender', 'in', ['Male'])])
+
+
+def test_value_range_and_state(store, everything):
+    assert store.value_range('Age') == (everything['Age'].min(), everything['Age'].max())
+    assert store.value_range('Test') == (1, TESTS)
+    assert store.value_range('Age', [('Gender', 'in', [])]) == (None, None)
+    assert store.state() == (TESTS, TESTS)
+
+
+def test_owners_only_see_their_own_tests(tmp_path):
+    shared = HistoryStore(tmp_path / 'history.db')
+    alice, bob = shared.for_owner('user:alice'), shared.for_owner('user:bob')
+    rng = random.Random(1)
+    tests = {alice.owner: [], bob.owner: []}
+    for i in range(20):
+        owner = alice if i % 3 else bob
+        tests[owner.owner].append(owner.append(record(rng, i), result=float(i), timestamp=START + i,
+                                               contributions=[0.0] * len(CONTRIBUTION_COLUMNS)))
+
+    for owner in (alice, bob):
+        mine = tests[owner.owner]
+        assert list(owner.query().index) == mine
+        assert owner.count() == len(mine)
+        assert owner.count([('Test', 'between', (1, MAX_TEST))]) == len(mine)
+        assert [int(chunk.index[0]) for chunk in owner.iter_query(chunk_rows=1)] == mine
+        assert owner.value_range('Test') == (mine[0], mine[-1])
+        assert set(owner.distinct('Name')) == {f'Patient {test - 1}' for test in mine}
+        assert owner.state() == (len(mine), mine[-1])
+        summary = owner.summary()
+        assert summary.count == len(mine)
+        assert sum(summary.category_counts['Gender'].values()) == len(mine)
+
+    assert alice.contributions(tests[bob.owner][0]) is None
+    assert bob.contributions(tests[bob.owner][0]) is not None
+    assert shared.count() == 20 and shared.summary().count == 20
+    assert alice.for_owner('user:carol').count() == 0 and alice.for_owner('user:carol').state() == (0, 0)
+    with pytest.raises(ValueError):
+        shared.append(record(rng, 20), result=1.0, timestamp=START)
+
+
+def test_tests_from_before_owners_belong_to_nobody(tmp_path):
+    path = tmp_path / 'history.db'
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp INTEGER NOT NULL, '
+                           'name TEXT NOT NULL, ic_number TEXT NOT NULL, age INTEGER NOT NULL, gender INTEGER NOT NULL, '
+                           'chest_pain_type INTEGER NOT NULL, resting_blood_pressure INTEGER NOT NULL, '
+                           'serum_cholesterol INTEGER NOT NULL, fasting_blood_sugar INTEGER NOT NULL, '
+                           'ecg_result INTEGER NOT NULL, max_heart_rate INTEGER NOT NULL, '
+                           'exercise_angina INTEGER NOT NULL, oldpeak REAL NOT NULL, st_slope INTEGER NOT NULL, '
+                           'result REAL NOT NULL)')
+        connection.execute("INSERT INTO history VALUES (1, 0, 'Old', 'IC', 50, 1, 0, 120, 200, 0, 0, 150, 0, 1.0, 0, 40.0)")
+    connection.close()
+
+    shared = HistoryStore(path)
+    assert shared.count() == 1 and shared.summary().count == 1
+    assert shared.for_owner('session:new').count() == 0
+    assert shared.for_owner('session:new').summary().count == 0
+
+
+def test_threads_share_one_connection_until_closed(tmp_path):
+    with HistoryStore(tmp_path / 'history.db', owner='clinic') as store:
+        def append_and_read(i):
+            store.append(record(random.Random(i), i), result=float(i), timestamp=START + i)
+            return store.count()
+
+        with ThreadPoolExecutor(8) as pool:
+            counts = list(pool.map(append_and_read, range(64)))
+        assert max(counts) == store.count() == store.summary().count == 64
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.count()
@@ -0,0 +1,77 @@
+"""Which artifact default_model_path() serves when a pickle and a native artifact sit side by side."""
+import hashlib
+import json
+import os
+
+import pytest
+
+from cardialyze import model_registry
+from cardialyze.model_artifact import manifest_path, supersedes_pickle
+
+PICKLE = b'pickled model'
+
+OTHER_PICKLE = b'retrained pickled model'
+
+
+def sha256(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    pickle_path, native_path = tmp_path / 'model.pkl', tmp_path / 'model.ubj'
+    monkeypatch.setattr(model_registry, 'PICKLE_PATH', pickle_path)
+    monkeypatch.setattr(model_registry, 'NATIVE_PATH', native_path)
+    monkeypatch.delenv('CARDIALYZE_MODEL_PATH', raising=False)
+    model_registry._pickle_hashes.clear()
+
+    def write(pickle, manifest):
+        native_path.write_bytes(b'native model')
+        manifest_path(native_path).write_text(json.dumps(manifest))
+        pickle_path.write_bytes(pickle)
+        # The pickle is the newer file, as when it is dropped in place after the artifact was made
+        os.utime(native_path, ns=(1_000_000_000, 1_000_000_000))
+        os.utime(pickle_path, ns=(2_000_000_000, 2_000_000_000))
+        return pickle_path, native_path
+
+    return write
+
+
+def converted(payload):
+    return {'source': {'kind': 'pickle', 'path': 'model.pkl', 'sha256': sha256(payload)}, 'training': {}}
+
+
+def trained(replaced):
+    return {'source': {'kind': 'dataset', 'path': 'OHCA.csv', 'sha256': sha256(b'dataset')},
+            'training': {'replaces_pickle': replaced and {'path': 'model.pkl', 'sha256': sha256(replaced)}}}
+
+
+def test_converted_artifact_is_served_for_its_own_pickle(artifacts):
+    _, native_path = artifacts(PICKLE, converted(PICKLE))
+    assert model_registry.default_model_path() == native_path
+
+
+def test_retrained_pickle_is_served_until_converted(artifacts):
+    pickle_path, _ = artifacts(OTHER_PICKLE, converted(PICKLE))
+    assert model_registry.default_model_path() == pickle_path
+
+
+def test_trained_artifact_replaces_the_pickle_it_was_trained_over(artifacts):
+    # Its source is the dataset, whose checksum never matches a pickle
+    _, native_path = artifacts(PICKLE, trained(PICKLE))
+    assert model_registry.default_model_path() == native_path
+
+
+def test_pickle_dropped_after_training_is_served(artifacts):
+    pickle_path, _ = artifacts(OTHER_PICKLE, trained(PICKLE))
+    assert model_registry.default_model_path() == pickle_path
+    pickle_path, _ = artifacts(OTHER_PICKLE, trained(None))
+    assert model_registry.default_model_path() == pickle_path
+
+
+def test_manifests_without_a_source_kind():
+    legacy_conversion = {'source': {'path': 'model.pkl', 'sha256': sha256(PICKLE)}}
+    legacy_training = {'source': {'path': 'OHCA.csv', 'sha256': sha256(PICKLE)}, 'training': {}}
+    assert supersedes_pickle(legacy_conversion, sha256(PICKLE))
+    assert not supersedes_pickle(legacy_training, sha256(PICKLE))
+    assert not supersedes_pickle({}, sha256(PICKLE))
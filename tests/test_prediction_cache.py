@@ -0,0 +1,154 @@
+"""PredictionCache bounds, invalidation and hit rate, and the bulk scoring that reads through it."""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cardialyze.batch import explain_frame, score_frame
+from cardialyze.contributions import CONTRIBUTION_COLUMNS
+from cardialyze import prediction_cache
+from cardialyze.features import CATEGORIES, FEATURE_COLUMNS, encode_frame
+from cardialyze.prediction_cache import PredictionCache
+
+
+class CountingPredictor:
+    """Scores a row by its Age code, and records the rows of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        positive = X[:, FEATURE_COLUMNS.index('Age')] / 100
+        return np.column_stack([1 - positive, positive])
+
+    def predict_contributions(self, X):
+        self.calls.append(len(X))
+        contributions = np.zeros((len(X), len(CONTRIBUTION_COLUMNS)))
+        contributions[:, -1] = X[:, FEATURE_COLUMNS.index('Age')] / 100
+        return contributions
+
+
+def model(version='v1'):
+    return SimpleNamespace(version=version, predictor=CountingPredictor())
+
+
+def patients(ages):
+    frame = pd.DataFrame({column: CATEGORIES[column][0] if column in CATEGORIES else 1
+                          for column in FEATURE_COLUMNS}, index=range(len(ages)))
+    frame['Age'] = ages
+    return frame
+
+
+@pytest.fixture
+def cache():
+    return PredictionCache()
+
+
+def test_least_recently_used_rows_are_evicted_beyond_max_entries():
+    cache = PredictionCache(max_entries=3)
+    entry = model()
+    X = encode_frame(patients([30, 40, 50, 60]))
+    cache.predict(entry, X[:3])
+    # Row 0 becomes the most recently used, so row 1 is the one evicted for row 3
+    cache.predict(entry, X[:1])
+    cache.predict(entry, X[3:])
+    assert len(cache) == 3
+    entry.predictor.calls.clear()
+
+    cache.predict(entry, X[[0, 2, 3]])
+    assert entry.predictor.calls == []
+    cache.predict(entry, X[[1]])
+    assert entry.predictor.calls == [1]
+    assert len(cache) == 3
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    cache = PredictionCache(ttl=60)
+    entry = model()
+    X = encode_frame(patients([30]))
+    cache.predict(entry, X)
+
+    now[0] += 59
+    cache.predict(entry, X)
+    assert entry.predictor.calls == [1]
+    assert not cache.get_many(entry, X)[2].any()
+
+    now[0] += 2
+    assert cache.get_many(entry, X)[2].all()
+    cache.predict(entry, X)
+    assert entry.predictor.calls == [1, 1]
+
+
+def test_new_model_version_drops_every_entry(cache):
+    old, new = model('v1'), model('v2')
+    X = encode_frame(patients([30, 40]))
+    cache.predict(old, X)
+
+    assert cache.get_many(new, X)[2].all()
+    cache.predict(new, X[:1])
+    assert new.predictor.calls == [1]
+    assert len(cache) == 1
+    # The old version's results are gone, not kept beside the new ones
+    assert cache.get_many(new, X)[2].tolist() == [False, True]
+
+
+def test_hit_rate_counts_distinct_rows_per_lookup(cache):
+    entry = model()
+    X = encode_frame(patients([30, 40, 40]))
+    assert cache.hit_rate == 0.0
+
+    cache.predict(entry, X)
+    assert (cache.hits, cache.misses) == (0, 2)
+    cache.predict(entry, X)
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.hit_rate == 0.5
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_bulk_scoring_only_scores_rows_missing_from_the_cache(cache):
+    entry = model()
+    frame = patients([30, 40, 50, 60, 40, 70])
+    cache.predict(entry, encode_frame(frame.iloc[[1, 3]]))
+    entry.predictor.calls.clear()
+
+    scores = score_frame(entry, frame, cache)
+
+    np.testing.assert_allclose(scores, [0.3, 0.4, 0.5, 0.6, 0.4, 0.7])
+    # Rows 0, 2 and 5 are the only misses, scored in one call
+    assert entry.predictor.calls == [3]
+
+
+def test_bulk_lookup_is_read_only(cache):
+    entry = model()
+    frame = patients([30, 40])
+    cache.predict(entry, encode_frame(frame.iloc[[0]]))
+    hits, misses = cache.hits, cache.misses
+
+    score_frame(entry, frame, cache)
+    score_frame(entry, frame, cache)
+
+    assert len(cache) == 1
+    assert (cache.hits, cache.misses) == (hits, misses)
+    assert entry.predictor.calls == [1, 1, 1]
+
+
+def test_bulk_explain_reuses_cached_contributions(cache):
+    entry = model()
+    frame = patients([30, 40, 50])
+    cache.explain(entry, encode_frame(frame.iloc[[0]]))
+    cache.predict(entry, encode_frame(frame.iloc[[1]]))
+    entry.predictor.calls.clear()
+
+    scores, contributions = explain_frame(entry, frame, cache)
+
+    # Row 1 was only scored, not explained, so it is explained again with row 2
+    assert entry.predictor.calls == [2]
+    np.testing.assert_allclose(contributions['Bias'], [0.3, 0.4, 0.5])
+    np.testing.assert_allclose(scores, 1 / (1 + np.exp(-np.array([0.3, 0.4, 0.5]))))
+